@@ -1,15 +1,27 @@
 import os
-import json
-import time
-import pandas as pd
 import sys
+import json
+import argparse
+import asyncio
 from dotenv import load_dotenv
 from google import genai
-from google.genai.errors import ServerError
+from google.genai.errors import ClientError, ServerError
+from batch_engine import AdaptiveBatchSizer, TokenBucket, run_batches
+from checkpoint import Checkpoint
+from response_cache import ResponseCache, normalize_message
+from fake_client import FakeGeminiClient
+# Shared loader lives at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from chat_loader import iter_chat_chunks, read_columns
 
 # Load API key from .env file
 load_dotenv()
 
+MODEL_NAME = "gemini-2.0-flash"
+
+# Seconds to wait after a 429 before the first retry, doubled on every later attempt
+RATE_LIMIT_BACKOFF = 5
+
 # Define evaluation categories
 EVALUATION_CRITERIA = [
     "Greeting & Introduction",
@@ -22,12 +34,15 @@ EVALUATION_CRITERIA = [
     "Follow-up Provided"
 ]
 
-def parse_response(response_text):
-    """Parse the JSON response from Gemini API and handle unexpected formats."""
-    cleaned = response_text.strip()
+def parse_response(response_text, expected_ids):
+    """
+    Parse Gemini's JSON array of evaluations.
 
-    # Debugging: Print the raw response to check what Gemini API is returning
-    print("Raw API Response:", cleaned)
+    Returns:
+    dict: Result dict for every expected message ID that came back well-formed.
+          IDs that are missing or malformed are left out so they can be re-sent.
+    """
+    cleaned = response_text.strip()
 
     # Ensure we are removing markdown-style code blocks
     if cleaned.startswith("```"):
@@ -38,40 +53,58 @@ def parse_response(response_text):
             lines = lines[:-1]
         cleaned = "\n".join(lines).strip()
 
-    # Try parsing the response into JSON
     try:
-        result = json.loads(cleaned)
-
-        # Ensure all expected keys are present
-        for item in EVALUATION_CRITERIA:
-            if item not in result:
-                result[item] = ""
-
-        return result
+        items = json.loads(cleaned)
     except json.JSONDecodeError as e:
         print(f"JSON Parsing Error: {e}")
         print("Response Text:", cleaned)
-        return {item: "" for item in EVALUATION_CRITERIA}  # Return empty values on failure
+        return {}
+
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list):
+        return {}
 
-def select_text_column(df: pd.DataFrame) -> str:
-    """Select the most relevant column containing dialogue text."""
+    parsed = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        # The model sometimes echoes IDs as strings ("0"); anything that isn't a whole number is malformed
+        try:
+            message_id = int(str(item.get("id")).strip())
+        except ValueError:
+            continue
+        if message_id not in expected_ids:
+            continue
+        parsed[message_id] = {
+            criterion: "1" if str(item.get(criterion, "")).strip().lower() in ("1", "true", "yes") else ""
+            for criterion in EVALUATION_CRITERIA
+        }
+    return parsed
+
+def select_text_column(columns) -> str:
+    """Select the most relevant column containing dialogue text from a header (or a DataFrame)."""
+    columns = list(getattr(columns, "columns", columns))
     preferred_columns = ["message", "conversation", "chat", "text"]
     for col in preferred_columns:
-        if col in df.columns:
+        if col in columns:
             return col
-    return df.columns[0]
+    return columns[0]
 
-def process_batch(client, messages: list, delimiter="-----"):
-    """Send batched customer support chat logs to Gemini for analysis."""
+def build_prompt(messages: dict) -> str:
+    """Build the Gemini prompt for a batch of chat messages keyed by message ID."""
     prompt = (
         "You are a customer service quality analyst. Assess each chat message based on the following criteria:\n"
         + "\n".join(EVALUATION_CRITERIA) +
-        "\n\nFor each chat log, return a JSON response with each criterion as a key (1 for yes, blank for no)."
-        f"\nSeparate JSON responses with: {delimiter}\n"
+        "\n\nThe chat messages are given as a JSON array of objects with an \"id\" and a \"text\"."
+        "\nReturn a single JSON array with exactly one object per message. Each object must contain the"
+        " message's \"id\" and each criterion as a key (1 for yes, blank for no).\n"
         "Ensure that the response is strictly formatted as valid JSON.\n"
         "Example Response Format:\n"
         "```json\n"
+        "[\n"
         "{\n"
+        '"id": 0,\n'
         '"Greeting & Introduction": "1",\n'
         '"Understanding the Issue": "",\n'
         '"Empathy": "1",\n'
@@ -81,68 +114,215 @@ def process_batch(client, messages: list, delimiter="-----"):
         '"Professionalism & Politeness": "1",\n'
         '"Follow-up Provided": ""\n'
         "}\n"
+        "]\n"
         "```\n"
     )
 
-    batch_text = f"\n{delimiter}\n".join(messages)
-    content = prompt + "\n\n" + batch_text
+    payload = [{"id": message_id, "text": text} for message_id, text in messages.items()]
+    return prompt + "\nChat messages:\n" + json.dumps(payload, ensure_ascii=False)
 
-    try:
-        response = client.models.generate_content(model="gemini-2.0-flash", contents=[content])
+async def process_batch_async(client, messages: list, limiter=None, sizer=None, max_retries=2):
+    """
+    Score a batch with Gemini, re-sending only the message IDs that failed to parse.
 
-        # Debugging: Print the full response before processing
-        print("Full API Response:", response.text)
+    Returns:
+    list: One result dict per message, or None where every attempt failed
+    """
+    results = {}
+    pending = dict(enumerate(messages))
 
-        parts = response.text.split(delimiter)
-        results = [parse_response(part.strip()) for part in parts if part.strip()]
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        if attempt:
+            print(f"Retrying {len(pending)} unparsed message(s) (attempt {attempt + 1}).")
+        if limiter is not None:
+            await limiter.acquire()
+        try:
+            response = await client.aio.models.generate_content(model=MODEL_NAME, contents=[build_prompt(pending)])
+            parsed = parse_response(response.text, pending)
+        except ServerError as e:
+            print(f"API Server Error: {e}")
+            await asyncio.sleep(2 ** attempt)
+            parsed = {}
+        except ClientError as e:
+            print(f"API Client Error: {e}")
+            # Quota errors clear up with time; other 4xx responses won't, so don't wait on them
+            if e.code == 429:
+                await asyncio.sleep(RATE_LIMIT_BACKOFF * 2 ** attempt)
+            parsed = {}
+        except Exception as e:
+            print(f"API Call Error: {e}")
+            await asyncio.sleep(2 ** attempt)
+            parsed = {}
 
-        # If Gemini returns too many or too few responses, adjust
-        if len(results) > len(messages):
-            results = results[:len(messages)]
-        elif len(results) < len(messages):
-            results.extend([{item: "" for item in EVALUATION_CRITERIA}] * (len(messages) - len(results)))
+        if sizer is not None:
+            sizer.record(len(pending), len(pending) - len(parsed))
+        results.update(parsed)
+        pending = {i: text for i, text in pending.items() if i not in parsed}
 
-        return results
-    except Exception as e:
-        print(f"API Call Error: {e}")
-        return [{item: "" for item in EVALUATION_CRITERIA} for _ in messages]
+    return [results.get(i) for i in range(len(messages))]
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python support_analysis.py <path_to_csv>")
-        sys.exit(1)
-    
-    input_csv = sys.argv[1]
-    output_csv = "customer_support_analysis.csv"
-    if os.path.exists(output_csv):
-        os.remove(output_csv)
+async def score_messages(client, messages: list, cache=None, limiter=None, sizer=None):
+    """Score a batch of cache misses, sending each distinct message to Gemini once."""
+    key_of = cache.key if cache is not None else normalize_message
+
+    to_score = {}
+    for message in messages:
+        to_score.setdefault(key_of(message), message)
+    if not to_score:
+        return []
+
+    unique_messages = list(to_score.values())
+    unique_results = await process_batch_async(client, unique_messages, limiter, sizer)
+    scored = dict(zip(to_score, unique_results))
+
+    if cache is not None:
+        successful = [(m, r) for m, r in zip(unique_messages, unique_results) if r is not None]
+        cache.put_many([m for m, _ in successful], [r for _, r in successful])
+
+    # None marks a message that never parsed; it is left out of the output and checkpoint so a rerun retries it
+    return [scored[key_of(message)] for message in messages]
+
+def iter_batches(chunks, text_col: str, sizer, checkpoint=None, cache=None):
+    """
+    Yield ((start_idx, batch, cached), misses) pairs from a stream of CSV chunks, skipping checkpointed rows.
+
+    Each chunk is looked up in the cache before it is split, so a batch covers
+    a run of consecutive rows holding at most one batch worth of cache misses.
+    `cached` has the cached result for every row of the batch (None on a miss)
+    and `misses` the messages that still need scoring, in row order. The batch
+    size is taken from the sizer each time a batch is formed and is fitted to
+    the misses alone. Batches never span two chunks, so only one chunk needs to
+    be held in memory at a time.
+    """
+    for chunk_start, chunk in chunks:
+        chunk_end = chunk_start + len(chunk)
+        ranges = checkpoint.missing(chunk_start, chunk_end) if checkpoint is not None else [(chunk_start, chunk_end)]
+        for range_start, range_end in ranges:
+            rows = chunk.iloc[range_start - chunk_start:range_end - chunk_start]
+            messages = [str(d).strip() for d in rows[text_col].tolist()]
+            cached = cache.get_many(messages) if cache is not None else [None] * len(messages)
+            miss_positions = [i for i, result in enumerate(cached) if result is None]
+
+            offset = 0
+            next_miss = 0
+            while offset < len(messages):
+                candidates = miss_positions[next_miss:next_miss + sizer.size]
+                if candidates:
+                    count = sizer.fit([messages[i] for i in candidates])
+                    end = candidates[count - 1] + 1
+                    next_miss += count
+                else:
+                    # Only cache hits are left; write them through in one batch
+                    end = len(messages)
+                misses = [messages[i] for i in range(offset, end) if cached[i] is None]
+                yield (range_start + offset, rows.iloc[offset:end], cached[offset:end]), misses
+                offset = end
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score customer support chat logs with Gemini.")
+    parser.add_argument("input_csv", help="Path to the chat log (CSV, Parquet or Arrow IPC)")
+    parser.add_argument("--output", default="customer_support_analysis.csv", help="Output CSV path")
+    parser.add_argument("--batch-size", type=int, default=10, help="Initial messages per API call")
+    parser.add_argument("--max-batch-size", type=int, default=50, help="Upper bound for adaptive batch sizing")
+    parser.add_argument("--token-budget", type=int, default=8000,
+                        help="Estimated prompt plus response tokens allowed per API call")
+    parser.add_argument("--chunk-rows", type=int, default=10_000,
+                        help="Rows read from the input CSV at a time")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum batches in flight at once")
+    parser.add_argument("--rate", type=float, default=2.0, help="Maximum API calls per second (0 disables limiting)")
+    parser.add_argument("--cache", default="gemini_cache.sqlite",
+                        help="SQLite file caching evaluations by normalized message text")
+    parser.add_argument("--cache-size", type=int, default=100_000,
+                        help="Maximum cached evaluations before least recently used ones are evicted")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the evaluation cache")
+    parser.add_argument("--restart", action="store_true",
+                        help="Ignore any checkpoint and rescore the whole input")
+    parser.add_argument("--fake-latency", type=float, default=None,
+                        help="Use a local fake Gemini client with this many seconds of latency per call")
+    parser.add_argument("--fake-drop-rate", type=float, default=0.0,
+                        help="Fraction of messages the fake client leaves out of each reply")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    input_csv = args.input_csv
+    output_csv = args.output
+    checkpoint = Checkpoint(input_csv, output_csv)
+    if args.restart:
+        checkpoint.reset()
+    elif checkpoint.load():
+        print(f"Resuming from checkpoint: {checkpoint.completed_rows()} records already scored.")
     
-    df = pd.read_csv(input_csv)
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
-    if not gemini_api_key:
-        raise ValueError("Missing GEMINI_API_KEY environment variable.")
-    client = genai.Client(api_key=gemini_api_key)
+    if args.fake_latency is not None:
+        client = FakeGeminiClient(EVALUATION_CRITERIA, latency=args.fake_latency, drop_rate=args.fake_drop_rate)
+    else:
+        gemini_api_key = os.getenv("GEMINI_API_KEY")
+        if not gemini_api_key:
+            raise ValueError("Missing GEMINI_API_KEY environment variable.")
+        client = genai.Client(api_key=gemini_api_key)
     
-    text_col = select_text_column(df)
+    cache = None if args.no_cache else ResponseCache(args.cache, MODEL_NAME, EVALUATION_CRITERIA, args.cache_size)
+    limiter = TokenBucket(args.rate)
+    sizer = AdaptiveBatchSizer(args.batch_size, max_size=args.max_batch_size, token_budget=args.token_budget)
+
+    text_col = select_text_column(read_columns(input_csv))
     print(f"Using column '{text_col}' for chat analysis.")
     
-    batch_size = 10
-    total = len(df)
-    for start_idx in range(0, total, batch_size):
-        end_idx = min(start_idx + batch_size, total)
-        batch = df.iloc[start_idx:end_idx]
-        messages = [str(d).strip() for d in batch[text_col].tolist()]
-        batch_results = process_batch(client, messages)
-        batch_df = batch.copy()
-        for item in EVALUATION_CRITERIA:
-            batch_df[item] = [res.get(item, "") for res in batch_results]
-        if start_idx == 0:
-            batch_df.to_csv(output_csv, index=False, encoding="utf-8-sig")
-        else:
-            batch_df.to_csv(output_csv, mode='a', index=False, header=False, encoding="utf-8-sig")
-        print(f"Processed {end_idx}/{total} records.")
-        time.sleep(1)
+    already_done = checkpoint.completed_rows()
+    header_written = checkpoint.output_bytes > 0
+    failed_rows = 0
+
+    def write_batch(batch_info, batch_results):
+        nonlocal header_written, failed_rows
+        start_idx, batch, cached = batch_info
+        # Slot the freshly scored results in between the cached ones, in row order
+        scored = iter(batch_results)
+        merged = [result if result is not None else next(scored) for result in cached]
+        scored_rows = [result is not None for result in merged]
+        failed_rows += scored_rows.count(False)
+
+        batch_df = batch[scored_rows].copy()
+        if len(batch_df):
+            for item in EVALUATION_CRITERIA:
+                batch_df[item] = [res.get(item, "") for res in merged if res is not None]
+            if not header_written:
+                batch_df.to_csv(output_csv, index=False, encoding="utf-8-sig")
+                header_written = True
+            else:
+                batch_df.to_csv(output_csv, mode='a', index=False, header=False, encoding="utf-8-sig")
+
+        # Checkpoint only the runs of rows that were scored, so a resume retries the failed ones
+        ranges = []
+        for offset, ok in enumerate(scored_rows):
+            if not ok:
+                continue
+            if ranges and ranges[-1][1] == start_idx + offset:
+                ranges[-1][1] += 1
+            else:
+                ranges.append([start_idx + offset, start_idx + offset + 1])
+        checkpoint.mark_many(ranges)
+        return len(batch)
+
+    stats = asyncio.run(run_batches(
+        iter_batches(iter_chat_chunks(input_csv, args.chunk_rows), text_col, sizer, checkpoint, cache),
+        lambda messages: score_messages(client, messages, cache, limiter, sizer),
+        write_batch,
+        concurrency=args.concurrency,
+        on_progress=lambda done: print(f"Processed {already_done + done} records.")
+    ))
     
+    if failed_rows:
+        print(f"{failed_rows} records could not be scored and were left out; run again to retry them.")
+    print(f"Final batch size: {sizer.size} (token budget {sizer.token_budget}).")
+    print(f"Scored {stats['rows']} records in {stats['elapsed']:.2f}s ({stats['rows_per_sec']:.1f} rows/sec).")
+    if cache is not None:
+        cache_stats = cache.stats()
+        print(f"Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+              f"({cache_stats['hit_rate']:.0%} hit rate), {cache_stats['entries']} entries stored.")
+        cache.close()
     print("Analysis complete. Results saved in:", output_csv)
 
 if __name__ == "__main__":
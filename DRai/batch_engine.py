@@ -0,0 +1,137 @@
+import asyncio
+import time
+from collections import deque
+
+
+class TokenBucket:
+    """
+    Async token-bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`, so short
+    bursts are allowed while the long-run request rate stays at `rate`.
+    A rate of 0 (or less) disables limiting.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens=1):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+def estimate_tokens(text):
+    """Rough token count for budgeting prompts (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+class AdaptiveBatchSizer:
+    """
+    Additive-increase / multiplicative-decrease batch sizing.
+
+    Every fully parsed call grows the batch by one message, and any call with
+    parse failures halves it, always within [min_size, max_size]. Batches are
+    also cut short when their estimated prompt plus response tokens would
+    exceed `token_budget`.
+    """
+
+    def __init__(self, initial=10, min_size=1, max_size=50, token_budget=8000, response_tokens_per_message=90):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.size = min(max(initial, self.min_size), self.max_size)
+        self.token_budget = token_budget
+        self.response_tokens_per_message = response_tokens_per_message
+        self.calls = 0
+        self.failed_messages = 0
+
+    def fit(self, messages):
+        """Number of leading messages (at least one) that fit in the current size and token budget."""
+        used = 0
+        for count, text in enumerate(messages[:self.size]):
+            used += estimate_tokens(text) + self.response_tokens_per_message
+            if used > self.token_budget and count > 0:
+                return count
+        return min(len(messages), self.size)
+
+    def record(self, sent, failed):
+        """Adjust the batch size after a call that sent `sent` messages and failed to parse `failed`."""
+        self.calls += 1
+        self.failed_messages += failed
+        if failed:
+            self.size = max(self.min_size, self.size // 2)
+        else:
+            self.size = min(self.max_size, self.size + 1)
+
+
+async def run_batches(batches, score, write, concurrency=4, limiter=None, on_progress=None):
+    """
+    Score batches concurrently and write their results in input order.
+
+    Parameters:
+    batches: Iterable of (batch, messages) pairs, consumed lazily
+    score: Coroutine function taking a list of messages and returning one result per message
+    write: Function called as write(batch, results) strictly in input order, returning the number of rows written
+    concurrency: Maximum number of batches in flight at once
+    limiter: Optional TokenBucket consulted before every scoring call
+    on_progress: Optional callback receiving the running row count after each write
+
+    Returns:
+    dict: 'rows', 'batches', 'elapsed' (seconds) and 'rows_per_sec'
+    """
+    concurrency = max(1, int(concurrency))
+    iterator = iter(batches)
+    pending = deque()
+    rows = 0
+    written = 0
+    start = time.perf_counter()
+
+    async def _score(messages):
+        if limiter is not None:
+            await limiter.acquire()
+        return await score(messages)
+
+    def _fill():
+        # Only pull the next batch when a slot frees up, so memory stays bounded
+        # by `concurrency` batches no matter how long the input is.
+        while len(pending) < concurrency:
+            try:
+                batch, messages = next(iterator)
+            except StopIteration:
+                return
+            pending.append((batch, messages, asyncio.ensure_future(_score(messages))))
+
+    try:
+        _fill()
+        while pending:
+            batch, messages, task = pending.popleft()
+            results = await task
+            # A batch can hold rows that need no scoring (e.g. cache hits), so the writer reports its row count
+            rows += write(batch, results)
+            written += 1
+            if on_progress is not None:
+                on_progress(rows)
+            _fill()
+    finally:
+        for _, _, task in pending:
+            task.cancel()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'batches': written,
+        'elapsed': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed > 0 else 0.0
+    }
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+
+SAMPLE_BYTES = 1024 * 1024
+
+
+def fingerprint_file(path):
+    """
+    Cheap fingerprint of an input file: its size plus a hash of its first and last MiB.
+
+    Hashing only the ends keeps restarts fast on multi-GB exports while still
+    catching the usual ways an input changes (rewrites, appends, truncation).
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(SAMPLE_BYTES))
+        if size > SAMPLE_BYTES:
+            f.seek(max(SAMPLE_BYTES, size - SAMPLE_BYTES))
+            digest.update(f.read(SAMPLE_BYTES))
+    return f"{size}:{digest.hexdigest()}"
+
+
+def _merge(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class Checkpoint:
+    """
+    Sidecar manifest recording which input rows are already in the output CSV.
+
+    The manifest stores the input fingerprint, the completed row ranges
+    (half-open [start, end) positions) and the output size at the last
+    checkpoint. On resume the output is truncated back to that size, so a
+    batch that was written but never recorded is dropped rather than duplicated.
+    Rows missing from the completed ranges (including ones that failed to
+    score) are processed on resume and appended after the rows already written.
+    """
+
+    def __init__(self, input_path, output_path, manifest_path=None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.manifest_path = manifest_path or output_path + ".manifest.json"
+        self.fingerprint = fingerprint_file(input_path)
+        self.completed = []
+        self.output_bytes = 0
+
+    def load(self):
+        """
+        Resume from an existing manifest if it matches the current input.
+
+        Returns:
+        bool: True if a previous run is being resumed, False if starting fresh
+        """
+        manifest = None
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Ignoring unreadable checkpoint {self.manifest_path}: {e}")
+
+        resumable = (
+            manifest is not None
+            and manifest.get('input_fingerprint') == self.fingerprint
+            and os.path.exists(self.output_path)
+            and os.path.getsize(self.output_path) >= manifest.get('output_bytes', 0)
+        )
+        if not resumable:
+            self.reset()
+            return False
+
+        self.completed = _merge(manifest.get('completed', []))
+        self.output_bytes = manifest.get('output_bytes', 0)
+        with open(self.output_path, 'r+b') as f:
+            f.truncate(self.output_bytes)
+        return True
+
+    def reset(self):
+        """Discard any previous output and manifest."""
+        for path in (self.output_path, self.manifest_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.completed = []
+        self.output_bytes = 0
+
+    def completed_rows(self):
+        return sum(end - start for start, end in self.completed)
+
+    def missing(self, start, end):
+        """Yield (start, end) sub-ranges of [start, end) not yet completed."""
+        cursor = start
+        for done_start, done_end in self.completed:
+            if done_end <= cursor:
+                continue
+            if done_start >= end:
+                break
+            if done_start > cursor:
+                yield cursor, done_start
+            cursor = max(cursor, done_end)
+        if cursor < end:
+            yield cursor, end
+
+    def mark(self, start, end):
+        """Record rows [start, end) as written and persist the manifest atomically."""
+        self.mark_many([[start, end]])
+
+    def mark_many(self, ranges):
+        """Record several [start, end) row ranges as written with a single manifest write."""
+        self.completed = _merge(self.completed + [list(r) for r in ranges])
+        self.output_bytes = os.path.getsize(self.output_path)
+        manifest = {
+            'input_fingerprint': self.fingerprint,
+            'output_bytes': self.output_bytes,
+            'completed': self.completed
+        }
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import random
+import time
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiClient:
+    """
+    Local stand-in for genai.Client used to exercise DRai without an API key.
+
+    It answers every prompt with a JSON array holding one evaluation per chat
+    message after sleeping for `latency` seconds (plus up to `jitter` seconds),
+    so throughput and ordering can be measured offline. With `drop_rate` set,
+    that fraction of messages is left out of each reply to exercise retries.
+    """
+
+    def __init__(self, criteria, latency=0.5, jitter=0.2, drop_rate=0.0, seed=None):
+        self.criteria = list(criteria)
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self.models = _FakeModels(self)
+        self.aio = _FakeAio(self)
+
+    def _delay(self):
+        return self.latency + self._random.uniform(0, self.jitter)
+
+    def _reply(self, contents):
+        self.calls += 1
+        content = contents[0] if isinstance(contents, list) else contents
+        # The batch is appended to the prompt as a JSON array after this marker
+        messages = json.loads(content.rsplit("Chat messages:\n", 1)[-1])
+        answers = []
+        for message in messages:
+            if self._random.random() < self.drop_rate:
+                continue
+            answer = {"id": message["id"]}
+            answer.update({item: self._random.choice(["1", ""]) for item in self.criteria})
+            answers.append(answer)
+        return _FakeResponse("```json\n" + json.dumps(answers) + "\n```")
+
+
+class _FakeModels:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def generate_content(self, model, contents):
+        time.sleep(self._owner._delay())
+        return self._owner._reply(contents)
+
+
+class _FakeAsyncModels:
+    def __init__(self, owner):
+        self._owner = owner
+
+    async def generate_content(self, model, contents):
+        await asyncio.sleep(self._owner._delay())
+        return self._owner._reply(contents)
+
+
+class _FakeAio:
+    def __init__(self, owner):
+        self.models = _FakeAsyncModels(owner)
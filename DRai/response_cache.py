@@ -0,0 +1,107 @@
+import hashlib
+import json
+import re
+import sqlite3
+import time
+
+
+def normalize_message(text):
+    """Normalize chat text so trivially different copies share a cache entry."""
+    return re.sub(r"\s+", " ", str(text)).strip().casefold()
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of per-message Gemini evaluations.
+
+    Entries are keyed by a hash of the normalized message text, the criteria
+    list and the model name, so changing either of the latter two never
+    returns stale scores. The cache holds at most `max_entries` rows and
+    evicts the least recently used ones when it grows past that.
+    """
+
+    def __init__(self, path, model, criteria, max_entries=100_000):
+        self.path = path
+        self.model = model
+        self.criteria = list(criteria)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS evaluations ("
+            " key TEXT PRIMARY KEY,"
+            " result TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON evaluations(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+
+    def key(self, message):
+        payload = json.dumps([normalize_message(message), self.criteria, self.model], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_many(self, messages):
+        """
+        Look up a list of messages.
+
+        Returns:
+        list: The cached result dict for each message, or None on a miss
+        """
+        keys = [self.key(m) for m in messages]
+        found = {}
+        unique = list(set(keys))
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(unique), 500):
+            chunk = unique[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT key, result FROM evaluations WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            found.update((k, json.loads(r)) for k, r in rows)
+
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE evaluations SET last_used = ? WHERE key = ?", [(now, k) for k in found]
+            )
+            self._conn.commit()
+
+        results = [found.get(k) for k in keys]
+        hits = sum(r is not None for r in results)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def put_many(self, messages, results):
+        """Store one result per message, then evict down to max_entries."""
+        now = time.time()
+        rows = [(self.key(m), json.dumps(r, ensure_ascii=False), now) for m, r in zip(messages, results)]
+        if not rows:
+            return
+        before = self._conn.total_changes
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO evaluations (key, result, last_used) VALUES (?, ?, ?)", rows
+        )
+        self._size += self._conn.total_changes - before
+        if self.max_entries and self._size > self.max_entries:
+            excess = self._size - self.max_entries
+            self._conn.execute(
+                "DELETE FROM evaluations WHERE key IN "
+                "(SELECT key FROM evaluations ORDER BY last_used ASC LIMIT ?)", (excess,)
+            )
+            self._size -= excess
+        self._conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': self._size
+        }
+
+    def close(self):
+        self._conn.close()
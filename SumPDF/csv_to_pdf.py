@@ -1,46 +1,438 @@
+"""
+Render a CSV as a landscape A4 table PDF.
+
+Rows are streamed from the file in chunks and packed into page-sized table
+segments, each starting with the header row, so memory stays bounded by one
+chunk and one page and build time grows linearly with the row count. Cells
+are drawn as plain strings, pre-wrapped to their column; widths and wrapped
+lines are memoized, so repeated values ("Yes", "No", "Satisfied") are
+measured once. Column widths come from the distribution of text widths in a
+random sample of rows.
+
+The build runs in two passes: every row's height is measured and the pages
+are planned, then the planned pages are drawn. With --workers N both passes
+are split across a process pool; each worker draws a contiguous range of
+pages into its own part file and the parts are merged with pypdf. One quick
+scan of the CSV records where every chunk starts, so workers seek straight
+to their rows instead of parsing the file from the top. Page breaks come
+from the one global plan, so headers and "Page i of N" footers match a
+single-process build. pypdf is optional; without it everything renders in
+one process.
+
+Usage:
+    python csv_to_pdf.py [csv_file] [--output pdf_file] [--chunk-rows N] [--workers N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+import numpy as np
 import pandas as pd
 from reportlab.lib.pagesizes import landscape, A4
 from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
 from reportlab.lib.units import cm
 
-csv_file = "customer_support_intro_dataset.csv"
-pdf_file = "customer_support_intro_dataset.pdf"
+# Shared loader lives at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from chat_loader import count_chat_rows, iter_chat_chunks, read_columns
 
-df = pd.read_csv(csv_file)
+try:
+    from pypdf import PdfWriter
+except ImportError:  # pragma: no cover - optional dependency
+    PdfWriter = None
 
-doc = SimpleDocTemplate(
-    pdf_file,
-    pagesize=landscape(A4),
-    leftMargin=0.5 * cm,
-    rightMargin=0.5 * cm,
-    topMargin=0.5 * cm,
-    bottomMargin=0.5 * cm
-)
+CSV_FILE = "customer_support_intro_dataset.csv"
+CHUNK_ROWS = 10_000
+SAMPLE_ROWS = 2_000  # Rows sampled to size the columns
+WIDTH_PERCENTILE = 90  # A column is sized for this share of its values on one line
+MIN_COLUMN_WIDTH = 1 * cm
+MEASURE_CACHE_SIZE = 100_000
 
-styles = getSampleStyleSheet()
-elements = []
+PAGE_SIZE = landscape(A4)
+MARGIN = 0.5 * cm
+FRAME_PADDING = 6  # SimpleDocTemplate's frame padding on each side
 
-# Data with paragraph formatting for wrapping
-data = [df.columns.tolist()] + df.values.tolist()
-formatted_data = [[Paragraph(str(cell), styles["Normal"]) for cell in row] for row in data]
+FONT_NAME = "Helvetica"
+HEADER_FONT_NAME = "Helvetica-Bold"
+FONT_SIZE = 6
+LEADING = FONT_SIZE * 1.2
+CELL_PADDING = 3  # Table's default top/bottom padding
+SIDE_PADDING = 6  # Table's default left/right padding
+HEADER_BOTTOM_PADDING = 5
+FOOTER_FONT_SIZE = 6
 
-column_widths = [4 * cm, 8.5 * cm] + [1.875 * cm] * (len(df.columns) - 2)
-
-table = Table(formatted_data, repeatRows=1, colWidths=column_widths)
-table.setStyle(TableStyle([
+TABLE_STYLE = TableStyle([
     ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
     ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-    ("FONTSIZE", (0, 0), (-1, -1), 6),
+    ("FONTNAME", (0, 0), (-1, -1), FONT_NAME),
+    ("FONTNAME", (0, 0), (-1, 0), HEADER_FONT_NAME),
+    ("FONTSIZE", (0, 0), (-1, -1), FONT_SIZE),
+    ("LEADING", (0, 0), (-1, -1), LEADING),
     ("ALIGN", (0, 0), (-1, -1), "LEFT"),
     ("VALIGN", (0, 0), (-1, -1), "TOP"),
     ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-    ("BOTTOMPADDING", (0, 0), (-1, 0), 5),
-]))
+    ("BOTTOMPADDING", (0, 0), (-1, 0), HEADER_BOTTOM_PADDING),
+])
+
+
+def body_width():
+    """Width available to a table on one page."""
+    return PAGE_SIZE[0] - 2 * MARGIN - 2 * FRAME_PADDING
+
+
+def body_height():
+    """Height available to a table on one page."""
+    return PAGE_SIZE[1] - 2 * MARGIN - 2 * FRAME_PADDING
+
+
+@lru_cache(maxsize=MEASURE_CACHE_SIZE)
+def text_width(text, font, size):
+    return stringWidth(text, font, size)
+
+
+@lru_cache(maxsize=MEASURE_CACHE_SIZE)
+def wrap_text(text, font, size, width):
+    """
+    Text wrapped at spaces to fit width, breaking words longer than a line.
+
+    Returns:
+    tuple: (the lines joined with newlines, number of lines)
+    """
+    lines = []
+    for line in simpleSplit(text, font, size, width):
+        while len(line) > 1 and text_width(line, font, size) > width:
+            cut = len(line) - 1
+            while cut > 1 and text_width(line[:cut], font, size) > width:
+                cut -= 1
+            lines.append(line[:cut])
+            line = line[cut:]
+        lines.append(line)
+    return "\n".join(lines), max(len(lines), 1)
+
+
+def sample_rows(csv_file, size=SAMPLE_ROWS, chunk_rows=CHUNK_ROWS):
+    """A uniform random sample of up to `size` rows (fixed seed), in one streaming pass."""
+    rng = np.random.default_rng(0)
+    sample = None
+    for _, chunk in iter_chat_chunks(csv_file, chunk_rows):
+        keys = pd.Series(rng.random(len(chunk)), index=chunk.index)
+        # Keep the rows with the smallest random keys seen so far
+        sample = pd.concat([sample, chunk.assign(_key=keys)]) if sample is not None else chunk.assign(_key=keys)
+        sample = sample.nsmallest(size, "_key")
+    if sample is None:
+        return []
+    return list(sample.drop(columns="_key").itertuples(index=False, name=None))
+
+
+def column_widths(columns, rows, total=None):
+    """
+    Column widths sized from the text widths of sampled rows.
+
+    Each column asks for the WIDTH_PERCENTILE-th percentile of its values'
+    widths, and never less than its longest header word. When the requests
+    fit, spare width is shared out in proportion to them; otherwise narrow
+    columns get what they ask for and the wide ones split the rest equally.
+
+    Parameters:
+    columns (list): Header names
+    rows (list): Sampled row value tuples
+    total (float): Width to fill (default: the page body width)
+
+    Returns:
+    list: One width per column, in points
+    """
+    total = total or body_width()
+    padding = 2 * SIDE_PADDING
+    minimum, desired = [], []
+    for i, name in enumerate(columns):
+        words = str(name).split() or [""]
+        header_word = max(text_width(word, HEADER_FONT_NAME, FONT_SIZE) for word in words)
+        floor = max(MIN_COLUMN_WIDTH, header_word + padding)
+        values = [text_width(str(row[i]), FONT_NAME, FONT_SIZE) for row in rows]
+        minimum.append(floor)
+        desired.append(max(floor, np.percentile(values, WIDTH_PERCENTILE) + padding if values else 0))
+
+    if sum(desired) <= total:
+        return [width * total / sum(desired) for width in desired]
+
+    # Water-fill: fix every column that needs less than an equal share of what is left
+    fixed = {}
+    while True:
+        free = [i for i in range(len(columns)) if i not in fixed]
+        share = (total - sum(fixed.values())) / len(free)
+        narrow = [i for i in free if desired[i] <= share]
+        if not narrow or len(narrow) == len(free):
+            break
+        fixed.update((i, desired[i]) for i in narrow)
+    return [fixed[i] if i in fixed else max(minimum[i], share) for i in range(len(columns))]
+
+
+def max_cell_lines(header_height):
+    """Most lines a cell can have so its row still fits on a page below the header."""
+    return max(1, int((body_height() - header_height - 2 * CELL_PADDING) / LEADING))
+
+
+def format_cell(value, width, header=False, max_lines=None):
+    """
+    A table cell for one value: its text wrapped to the column as a plain string.
+
+    A table can't split a row across pages, so text longer than max_lines
+    lines is cut to fit and ends with an ellipsis line.
+
+    Returns:
+    tuple: (cell text, height of its lines)
+    """
+    font = HEADER_FONT_NAME if header else FONT_NAME
+    text, lines = wrap_text(str(value), font, FONT_SIZE, width - 2 * SIDE_PADDING)
+    if max_lines is not None and lines > max_lines:
+        text, lines = "\n".join(text.split("\n")[:max_lines - 1] + ["\u2026"]), max_lines
+    return text, lines * LEADING
+
+
+def format_row(values, widths, header=False, max_lines=None):
+    """
+    Cells of one row and the row's height (tallest cell plus padding), so the
+    table never has to measure them again.
+    """
+    cells, heights = zip(*(format_cell(value, width, header, max_lines) for value, width in zip(values, widths)))
+    padding = CELL_PADDING + (HEADER_BOTTOM_PADDING if header else CELL_PADDING)
+    return list(cells), max(heights) + padding
+
+
+def iter_rows(csv_file, start=0, stop=None, chunk_rows=CHUNK_ROWS, offsets=None):
+    """
+    Values of rows [start, stop) as tuples, read chunk by chunk.
+
+    With the CSV's chunk offsets (see count_chat_rows) reading seeks straight
+    to the chunk holding `start`. It still begins on a chunk boundary, so each
+    chunk is parsed, and its column types inferred, exactly as a full read would.
+    """
+    first, byte_offset = start, None
+    if offsets:
+        chunk = min(start // chunk_rows, len(offsets) - 1)
+        first, byte_offset = chunk * chunk_rows, offsets[chunk]
+    for offset, chunk in iter_chat_chunks(csv_file, chunk_rows, first, byte_offset):
+        if stop is not None and offset >= stop:
+            return
+        if offset + len(chunk) <= start:
+            continue
+        chunk = chunk.iloc[max(start - offset, 0):None if stop is None else stop - offset]
+        yield from chunk.itertuples(index=False, name=None)
+
+
+def measure_rows(csv_file, widths, start=0, stop=None, chunk_rows=CHUNK_ROWS, max_lines=None, offsets=None):
+    """Heights of rows [start, stop) as they will be drawn."""
+    return [format_row(values, widths, max_lines=max_lines)[1]
+            for values in iter_rows(csv_file, start, stop, chunk_rows, offsets)]
+
+
+def paginate(heights, header_height):
+    """
+    Number of rows on each page.
+
+    Rows are added to the current page until the next one would not fit
+    below the header. No row is taller than that space: format_cell cuts
+    cells to max_cell_lines(header_height).
+    """
+    available = body_height() - header_height
+    pages, count, used = [], 0, 0
+    for height in heights:
+        if count and used + height > available:
+            pages.append(count)
+            count, used = 0, 0
+        count += 1
+        used += height
+    if count:
+        pages.append(count)
+    return pages
+
+
+def split_pages(pages, parts):
+    """
+    Split the page plan into at most `parts` contiguous ranges with about the
+    same number of rows each.
+
+    Returns:
+    list: (first_row, first_page, page row counts) per range; pages count from 1
+    """
+    total = sum(pages)
+    ranges, first_row, first_page, current = [], 0, 1, []
+    rows = 0
+    for number, count in enumerate(pages, start=1):
+        current.append(count)
+        rows += count
+        if rows >= total * (len(ranges) + 1) / parts and number < len(pages):
+            ranges.append((first_row, first_page, current))
+            first_row, first_page, current = rows, number + 1, []
+    if current:
+        ranges.append((first_row, first_page, current))
+    return ranges
+
+
+def page_table(header, header_height, rows, heights, widths):
+    """One page's table segment: the header row followed by its rows, with known row heights."""
+    table = Table([header] + rows, colWidths=widths, rowHeights=[header_height] + heights, repeatRows=1)
+    table.setStyle(TABLE_STYLE)
+    return table
+
+
+class FlowableStream:
+    """
+    List-like view of a flowable generator for doc.build.
+
+    The document template only looks at and removes flowables from the front
+    of its list (and puts split remainders back there), so pulling them from
+    the generator on demand keeps just the page being laid out in memory.
+    """
+
+    def __init__(self, flowables):
+        self._source = iter(flowables)
+        self._buffer = []
+
+    def _fill(self, count):
+        while len(self._buffer) < count:
+            flowable = next(self._source, None)
+            if flowable is None:
+                return
+            self._buffer.append(flowable)
+
+    def __len__(self):
+        self._fill(1)
+        return len(self._buffer)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            self._fill(index.stop if index.stop is not None else float("inf"))
+        else:
+            self._fill(index + 1)
+        return self._buffer[index]
+
+    def __setitem__(self, index, value):
+        self._buffer[index] = value
+
+    def __delitem__(self, index):
+        self._fill(index + 1 if isinstance(index, int) else 1)
+        del self._buffer[index]
+
+    def pop(self, index=0):
+        self._fill(index + 1)
+        return self._buffer.pop(index)
+
+    def insert(self, index, flowable):
+        self._buffer.insert(index, flowable)
+
+
+def render_pages(csv_file, pdf_file, widths, pages, first_row=0, first_page=1, total_pages=None,
+                 chunk_rows=CHUNK_ROWS, offsets=None):
+    """
+    Draw the planned pages starting at row first_row into pdf_file, numbering
+    them from first_page out of total_pages.
+
+    Returns:
+    int: Number of pages drawn
+    """
+    columns = read_columns(csv_file)
+    header, header_height = format_row(columns, widths, header=True)
+    max_lines = max_cell_lines(header_height)
+    total_pages = total_pages or first_page + len(pages) - 1
+
+    def footer(canvas, doc):
+        canvas.saveState()
+        canvas.setFont(FONT_NAME, FOOTER_FONT_SIZE)
+        canvas.drawRightString(PAGE_SIZE[0] - MARGIN, MARGIN / 2,
+                               f"Page {first_page + doc.page - 1} of {total_pages}")
+        canvas.restoreState()
+
+    def segments():
+        rows = iter_rows(csv_file, first_row, first_row + sum(pages), chunk_rows, offsets)
+        for count in pages:
+            cells, heights = zip(*(format_row(next(rows), widths, max_lines=max_lines) for _ in range(count)))
+            yield page_table(header, header_height, list(cells), list(heights), widths)
+
+    doc = SimpleDocTemplate(
+        pdf_file,
+        pagesize=PAGE_SIZE,
+        leftMargin=MARGIN,
+        rightMargin=MARGIN,
+        topMargin=MARGIN,
+        bottomMargin=MARGIN
+    )
+    doc.build(FlowableStream(segments()), onFirstPage=footer, onLaterPages=footer)
+    return doc.page
+
+
+def merge_pdfs(part_files, pdf_file):
+    writer = PdfWriter()
+    for part_file in part_files:
+        writer.append(part_file)
+    with open(pdf_file, "wb") as output:
+        writer.write(output)
+
+
+def build_pdf(csv_file, pdf_file, chunk_rows=CHUNK_ROWS, workers=1):
+    """
+    Render csv_file into pdf_file, across `workers` processes when more than one.
+
+    Returns:
+    int: Number of pages written
+    """
+    columns = read_columns(csv_file)
+    widths = column_widths(columns, sample_rows(csv_file, chunk_rows=chunk_rows))
+    header_height = format_row(columns, widths, header=True)[1]
+    max_lines = max_cell_lines(header_height)
+
+    if workers <= 1 or PdfWriter is None:
+        if workers > 1:
+            print("pypdf is not installed; rendering in one process.")
+        pages = paginate(measure_rows(csv_file, widths, chunk_rows=chunk_rows, max_lines=max_lines), header_height)
+        render_pages(csv_file, pdf_file, widths, pages, total_pages=len(pages), chunk_rows=chunk_rows)
+        return len(pages)
+
+    # One cheap scan for the row count and where each chunk starts, so workers seek to their rows
+    total_rows, offsets = count_chat_rows(csv_file, chunk_rows)
+    chunks = -(-total_rows // chunk_rows)
+    bounds = [min(total_rows, chunks * i // workers * chunk_rows) for i in range(workers + 1)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        heights = []
+        for part in executor.map(measure_rows, repeat(csv_file), repeat(widths), bounds[:-1], bounds[1:],
+                                 repeat(chunk_rows), repeat(max_lines), repeat(offsets)):
+            heights.extend(part)
+        pages = paginate(heights, header_height)
+        ranges = split_pages(pages, workers)
+
+        # Parts go beside the output so a large export doesn't fill a small /tmp
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(pdf_file))) as tmp_dir:
+            part_files = [os.path.join(tmp_dir, f"part_{i:04d}.pdf") for i in range(len(ranges))]
+            futures = [
+                executor.submit(render_pages, csv_file, part_file, widths, part_pages, first_row, first_page,
+                                len(pages), chunk_rows, offsets)
+                for part_file, (first_row, first_page, part_pages) in zip(part_files, ranges)
+            ]
+            for future in futures:
+                future.result()
+            merge_pdfs(part_files, pdf_file)
+    return len(pages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a CSV as a landscape table PDF.")
+    parser.add_argument("csv_file", nargs="?", default=CSV_FILE)
+    parser.add_argument("--output", default=None, help="PDF path (default: the CSV path with a .pdf extension)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows read from the CSV at a time")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes rendering page ranges in parallel (0 = CPU count; needs pypdf)")
+    args = parser.parse_args()
+
+    pdf_file = args.output or os.path.splitext(args.csv_file)[0] + ".pdf"
+    build_pdf(args.csv_file, pdf_file, args.chunk_rows, args.workers or os.cpu_count() or 1)
+    print(f"Final PDF generated without column cutoff: {pdf_file}")
 
-elements.append(table)
-doc.build(elements)
 
-print(f"Final PDF generated without column cutoff: {pdf_file}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Shared chat-log loader for the analyzers in this repository.
+
+Accepts CSV, Parquet or Arrow IPC (.arrow/.feather/.ipc) files. A CSV can be
+converted once into a typed Arrow IPC cache next to it: categorical
+issue/sentiment columns and parsed timestamps. Later loads memory-map that
+cache instead of re-parsing the CSV. pyarrow is optional; without it
+everything falls back to plain pandas CSV parsing.
+
+Usage:
+    python chat_loader.py convert chat_data.csv
+"""
+import argparse
+import os
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+CATEGORICAL_COLUMNS = ('issue_category', 'sentiment', 'sender', 'Category')
+TIMESTAMP_COLUMNS = ('timestamp', 'Date')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+_SOURCE_KEY = b'chat_loader_source'
+
+
+def _extension(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def cache_path_for(csv_path):
+    """Location of the columnar cache for a CSV: a hidden .arrow file beside it."""
+    directory, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(directory, f".{os.path.splitext(name)[0]}.arrow")
+
+
+def _source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}".encode()
+
+
+def apply_types(df):
+    """Give known chat-log columns compact dtypes: categoricals and parsed timestamps."""
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    for col in TIMESTAMP_COLUMNS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    return df
+
+
+def _read_arrow(path):
+    with pa.memory_map(path, 'r') as source:
+        return pa_ipc.open_file(source).read_all()
+
+
+def _cache_is_fresh(csv_path, cache_path):
+    if pa is None or not os.path.exists(cache_path):
+        return False
+    try:
+        with pa.memory_map(cache_path, 'r') as source:
+            metadata = pa_ipc.open_file(source).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    return metadata.get(_SOURCE_KEY) == _source_signature(csv_path)
+
+
+def convert_csv(csv_path, cache_path=None):
+    """
+    Parse a CSV once and write it as a typed, uncompressed Arrow IPC file.
+
+    Returns:
+    str: Path of the written cache
+    """
+    if pa is None:
+        raise ImportError("pyarrow is required to build a columnar cache.")
+    cache_path = cache_path or cache_path_for(csv_path)
+    table = pa.Table.from_pandas(apply_types(pd.read_csv(csv_path)), preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_SOURCE_KEY] = _source_signature(csv_path)
+    table = table.replace_schema_metadata(metadata)
+
+    tmp_path = cache_path + ".tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink, pa_ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def load_chat_log(path, build_cache=False):
+    """
+    Load a chat log from CSV, Parquet or Arrow IPC.
+
+    For a CSV, a fresh columnar cache (see convert_csv) is memory-mapped when
+    present. Otherwise the CSV is parsed, and the cache is written for next
+    time when build_cache is True. A cache goes stale when the CSV's size or
+    modification time changes.
+    """
+    ext = _extension(path)
+    if ext in ARROW_EXTENSIONS:
+        return apply_types(_read_arrow(path).to_pandas())
+    if ext in PARQUET_EXTENSIONS:
+        return apply_types(pd.read_parquet(path))
+
+    cache_path = cache_path_for(path)
+    if _cache_is_fresh(path, cache_path):
+        return _read_arrow(cache_path).to_pandas()
+    if build_cache and pa is not None:
+        convert_csv(path, cache_path)
+        return _read_arrow(cache_path).to_pandas()
+    return apply_types(pd.read_csv(path))
+
+
+def read_columns(path):
+    """Column names of a chat log without loading its rows."""
+    ext = _extension(path)
+    if ext in ARROW_EXTENSIONS:
+        with pa.memory_map(path, 'r') as source:
+            return pa_ipc.open_file(source).schema.names
+    if ext in PARQUET_EXTENSIONS:
+        return pq.read_schema(path).names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def csv_chunk_offsets(path, chunk_rows=10_000):
+    """
+    Scan a CSV for the byte offset where every chunk of chunk_rows rows starts.
+
+    Records are found by counting quote characters rather than parsing fields:
+    a newline ends a record only when the quotes seen so far are balanced, so
+    quoted fields may span lines. Blank lines are skipped, as pandas does.
+
+    Returns:
+    tuple: (total_rows, offsets) - offsets[i] is the position of row i * chunk_rows
+    """
+    offsets = []
+    rows = -1  # The header is the first record
+    position = 0
+    quotes = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if quotes % 2 == 0:
+                if not line.strip():
+                    position += len(line)
+                    continue
+                if rows >= 0 and rows % chunk_rows == 0:
+                    offsets.append(position)
+            quotes += line.count(b'"')
+            position += len(line)
+            if quotes % 2 == 0:
+                rows += 1
+    return max(rows, 0), offsets
+
+
+def count_chat_rows(path, chunk_rows=10_000):
+    """
+    Row count of a chat log, plus chunk offsets for a CSV read without its cache.
+
+    Columnar files (and fresh caches) are counted from their metadata.
+
+    Returns:
+    tuple: (total_rows, offsets) - offsets as from csv_chunk_offsets, or None
+    """
+    ext = _extension(path)
+    if ext == '.csv' or ext not in ARROW_EXTENSIONS + PARQUET_EXTENSIONS:
+        cache_path = cache_path_for(path)
+        if not _cache_is_fresh(path, cache_path):
+            return csv_chunk_offsets(path, chunk_rows)
+        path, ext = cache_path, '.arrow'
+    if ext in PARQUET_EXTENSIONS:
+        return pq.ParquetFile(path).metadata.num_rows, None
+    with pa.memory_map(path, 'r') as source:
+        reader = pa_ipc.open_file(source)
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches)), None
+
+
+def iter_chat_chunks(path, chunk_rows=10_000, start=0, byte_offset=None):
+    """
+    Yield (start_idx, chunk) DataFrames of at most chunk_rows rows, from row `start` on.
+
+    Rows are streamed straight from the file (or its fresh cache), so memory
+    stays bounded by one chunk whatever the file size. Columnar files skip to
+    `start` through their batch metadata. A CSV is parsed from the top unless
+    byte_offset gives the position of row `start` (see csv_chunk_offsets).
+    """
+    ext = _extension(path)
+    if ext == '.csv' or ext not in ARROW_EXTENSIONS + PARQUET_EXTENSIONS:
+        cache_path = cache_path_for(path)
+        if not _cache_is_fresh(path, cache_path):
+            yield from _iter_csv_chunks(path, chunk_rows, start, byte_offset)
+            return
+        path, ext = cache_path, '.arrow'
+
+    if ext in PARQUET_EXTENSIONS:
+        parquet = pq.ParquetFile(path)
+        skipped, row_groups = 0, []
+        for i in range(parquet.num_row_groups):
+            rows = parquet.metadata.row_group(i).num_rows
+            if not row_groups and skipped + rows <= start:
+                skipped += rows
+            else:
+                row_groups.append(i)
+        batches = parquet.iter_batches(batch_size=chunk_rows, row_groups=row_groups) if row_groups else iter(())
+    else:
+        # Record batches of a memory-mapped IPC file are zero-copy views, so skipping them reads nothing
+        source = pa.memory_map(path, 'r')
+        reader = pa_ipc.open_file(source)
+        skipped, first = 0, 0
+        while first < reader.num_record_batches and skipped + reader.get_batch(first).num_rows <= start:
+            skipped += reader.get_batch(first).num_rows
+            first += 1
+        batches = (reader.get_batch(i) for i in range(first, reader.num_record_batches))
+
+    start_idx = start
+    skip = start - skipped
+    for batch in batches:
+        if skip:
+            batch, skip = batch.slice(skip), max(skip - batch.num_rows, 0)
+        for offset in range(0, batch.num_rows, chunk_rows):
+            chunk = batch.slice(offset, chunk_rows).to_pandas()
+            yield start_idx, chunk
+            start_idx += len(chunk)
+
+
+def _iter_csv_chunks(path, chunk_rows, start, byte_offset):
+    if byte_offset is None:
+        start_idx = 0
+        for chunk in pd.read_csv(path, chunksize=chunk_rows):
+            if start_idx + len(chunk) > start:
+                yield max(start_idx, start), chunk.iloc[max(start - start_idx, 0):]
+            start_idx += len(chunk)
+        return
+
+    columns = read_columns(path)
+    with open(path, 'rb') as f:
+        f.seek(byte_offset)
+        start_idx = start
+        for chunk in pd.read_csv(f, header=None, names=columns, chunksize=chunk_rows):
+            yield start_idx, chunk
+            start_idx += len(chunk)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat-log loading utilities.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert = subparsers.add_parser("convert", help="Build the columnar cache for a CSV")
+    convert.add_argument("csv_path")
+    convert.add_argument("--output", default=None, help="Cache path (default: hidden .arrow file beside the CSV)")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        print(f"Columnar cache written to: {convert_csv(args.csv_path, args.output)}")
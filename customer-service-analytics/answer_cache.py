@@ -0,0 +1,149 @@
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+import numpy as np
+from config import (ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MAX_ENTRIES,
+                    ANSWER_CACHE_SEMANTIC, ANSWER_CACHE_SIMILARITY)
+
+EMBEDDING_DIM = 512
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+_NUMBER = re.compile(r'\d+(?:[.-]\d+)*')
+# Words that flip what a question asks about while barely changing its embedding
+_POLARITY = re.compile(r'\b(positive|negative|neutral|good|bad|best|worst|highest|lowest|most|least|more|less|'
+                       r'above|below|fastest|slowest|longest|shortest|increas\w*|decreas\w*|'
+                       r'(?:un|dis)?satisf\w*|(?:un)?happy|angry|not|no|never|without)\b')
+
+
+def normalize_question(question):
+    """Lower-case, drop punctuation and collapse whitespace, so trivially different phrasings share a key."""
+    return ' '.join(_TOKEN.findall(question.lower()))
+
+
+def question_signature(normalized, entities=()):
+    """Numbers, polarity words and named entities a similar question must share exactly."""
+    return (tuple(_NUMBER.findall(normalized)),
+            frozenset(_POLARITY.findall(normalized)),
+            frozenset(str(entity).lower() for entity in entities))
+
+
+def embed_question(normalized):
+    """
+    Hashing-trick embedding of a normalized question: word unigrams and
+    bigrams hashed into EMBEDDING_DIM buckets, L2-normalized. Needs no model
+    and is deterministic across processes (crc32, not hash()).
+    """
+    words = normalized.split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for feature in features:
+        vector[zlib.crc32(feature.encode()) % EMBEDDING_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    """
+    Chat answers keyed by (customer_id, dataset version, normalized question).
+
+    Entries expire after `ttl` seconds and the least recently used are dropped
+    beyond `max_entries`. Because the dataset version is part of the key,
+    appending or re-uploading data makes old answers unreachable; they are
+    purged once a lookup arrives with a different version. With `semantic`
+    enabled (off by default), a miss falls back to the most similar cached
+    question for the same dataset version (cosine similarity of hashing
+    embeddings) when it clears `similarity` and has the same signature:
+    the same numbers and dates, polarity words (positive/negative, best/worst,
+    ...) and entities. Entities are passed in by the caller, e.g. the
+    category, operator and customer names the question mentions.
+    """
+
+    def __init__(self, ttl=ANSWER_CACHE_TTL_SECONDS, max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                 semantic=ANSWER_CACHE_SEMANTIC, similarity=ANSWER_CACHE_SIMILARITY):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.semantic = semantic
+        self.similarity = similarity
+        self._entries = OrderedDict()  # key -> (answer, expires_at, embedding, signature)
+        self._versions = {}  # customer_id -> dataset version of the latest lookup
+        self._lock = threading.Lock()
+        self.metrics = {'hits': 0, 'semantic_hits': 0, 'misses': 0, 'expired': 0, 'invalidated': 0}
+
+    def _check_version(self, customer_id, version):
+        # Caller holds self._lock; drop answers computed from any other version of this dataset
+        if self._versions.get(customer_id, version) != version:
+            stale = [key for key in self._entries if key[0] == customer_id and key[1] != version]
+            for key in stale:
+                del self._entries[key]
+            self.metrics['invalidated'] += len(stale)
+        self._versions[customer_id] = version
+
+    def _semantic_lookup(self, customer_id, version, normalized, entities, now):
+        # Caller holds self._lock. Similar wording about a different date, number,
+        # polarity or entity is a different question, so only same-signature entries compete.
+        signature = question_signature(normalized, entities)
+        candidates = [(key, entry) for key, entry in self._entries.items()
+                      if key[0] == customer_id and key[1] == version and entry[1] > now
+                      and entry[3] == signature]
+        if not candidates:
+            return None
+        matrix = np.stack([entry[2] for _, entry in candidates])
+        scores = matrix @ embed_question(normalized)
+        best = int(np.argmax(scores))
+        key, entry = candidates[best]
+        if scores[best] < self.similarity:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def get(self, customer_id, version, question, entities=()):
+        """The cached answer for this question and dataset version, or None."""
+        normalized = normalize_question(question)
+        key = (customer_id, version, normalized)
+        now = time.time()
+        with self._lock:
+            self._check_version(customer_id, version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.metrics['hits'] += 1
+                    return entry[0]
+                del self._entries[key]
+                self.metrics['expired'] += 1
+            if self.semantic:
+                answer = self._semantic_lookup(customer_id, version, normalized, entities, now)
+                if answer is not None:
+                    self.metrics['semantic_hits'] += 1
+                    return answer
+            self.metrics['misses'] += 1
+            return None
+
+    def put(self, customer_id, version, question, answer, entities=()):
+        normalized = normalize_question(question)
+        embedding = embed_question(normalized) if self.semantic else None
+        signature = question_signature(normalized, entities)
+        with self._lock:
+            if self._versions.get(customer_id, version) != version:
+                return  # Answer was computed from data that has since changed
+            key = (customer_id, version, normalized)
+            self._entries[key] = (answer, time.time() + self.ttl, embedding, signature)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, customer_id):
+        """Forget every cached answer for a customer."""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == customer_id]
+            for key in stale:
+                del self._entries[key]
+            self.metrics['invalidated'] += len(stale)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics, entries=len(self._entries), semantic=self.semantic)
+        lookups = stats['hits'] + stats['semantic_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['semantic_hits']) / lookups if lookups else 0.0
+        return stats
@@ -1,15 +1,29 @@
 import os
-import asyncio
+import sys
 import json
-import threading
+import time
+import uuid
 import pandas as pd
-from dotenv import load_dotenv, find_dotenv
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, send_file
 from flask_socketio import SocketIO, emit
 from werkzeug.utils import secure_filename
-from google import genai
-from visualization import generate_sentiment_plot, generate_category_distribution, generate_response_time_plot
+from visualization import render_customer_charts
+from chart_data import CHART_KINDS, build_chart_data
+from rollups import summarize, table_records
 from chat_analysis import analyze_customer_chats
+from llm_client import get_llm_client
+from answer_cache import AnswerCache
+from query_engine import QueryRouter
+from dataset_store import DatasetStore, aggregate_drift
+from chat_store import ChatStore
+from jobs import JobScheduler, JobCancelled, QueueFull, raise_if_cancelled
+from config import (DATASET_STORE_MAX_MB, ANALYSIS_WORKERS, ANALYSIS_QUEUE_SIZE,
+                    CHAT_WORKERS, CHAT_QUEUE_SIZE, REGENERATE_SENTIMENT_DELTA,
+                    REGENERATE_CATEGORY_SHARE_DELTA, REGENERATE_RESPONSE_TIME_RATIO,
+                    RENDER_PNG_CHARTS, CHART_MAX_POINTS)
+# Shared loader lives at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from chat_loader import load_chat_log, apply_types
 
 # Initialize Flask and SocketIO
 app = Flask(__name__)
@@ -18,16 +32,31 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload size
 socketio = SocketIO(app, async_mode='threading')
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# Load .env and initialize Gemini
-dotenv_path = find_dotenv()
-load_dotenv(dotenv_path)
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Chat answers per (customer, dataset version, question)
+answer_cache = AnswerCache()
+# Exact local answers for aggregate questions, tried before the LLM
+query_router = QueryRouter()
 
-# Create Gemini client
-client = genai.Client(api_key=GEMINI_API_KEY)
+# Parsed datasets and their aggregates, keyed by customer_id
+dataset_store = DatasetStore(max_bytes=DATASET_STORE_MAX_MB * 1024 * 1024)
 
-# Global variable to store the most recently uploaded data
-uploaded_data = {}
+# Bounded worker pools: uploads and chat messages queue here instead of spawning a thread each
+analysis_jobs = JobScheduler('analysis', max_workers=ANALYSIS_WORKERS, max_queue=ANALYSIS_QUEUE_SIZE)
+chat_jobs = JobScheduler('chat', max_workers=CHAT_WORKERS, max_queue=CHAT_QUEUE_SIZE)
+
+# Operator/customer aggregates across all uploads, rebuilt from the uploads folder on startup
+chat_store = ChatStore()
+
+# Nothing above starts a thread or a job: the chart render pool uses spawn, which re-executes
+# this module in every worker. The shared Gemini client (configured from .env via config.py)
+# is created on first use by get_llm_client(); background work starts under the main guard.
+
+def load_customer_file(customer_id):
+    """Load a customer's uploaded CSV from disk; used when the dataset is not in memory."""
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{secure_filename(customer_id)}.csv")
+    if not os.path.exists(file_path):
+        return None
+    return load_chat_log(file_path), file_path
 
 # Flask routes
 @app.route('/')
@@ -44,46 +73,167 @@ def upload_file():
     if file:
         filename = secure_filename(file.filename)
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        socketio.emit('update', {'message': '🟢 File uploaded successfully, starting analysis...'})
-        threading.Thread(target=background_task, args=(file_path,)).start()
-        return 'File uploaded and processing started.', 200
+        # Saved under a temporary name and moved into place by the job, so a rejected
+        # upload never replaces the customer's file that the loaded dataset came from
+        upload_path = f"{file_path}.{uuid.uuid4().hex}.upload"
+        file.save(upload_path)
+        customer_id = os.path.splitext(filename)[0]
+        # Progress and charts go only to the uploader's socket; without one they are broadcast
+        sid = request.form.get('sid') or None
+        try:
+            job = analysis_jobs.submit(background_task, file_path, upload_path, sid, kind='analysis')
+        except QueueFull:
+            os.remove(upload_path)
+            return jsonify({'error': 'Server is busy analyzing other uploads, please retry shortly.'}), 429
+        socketio.emit('update', {'message': '🟢 File uploaded successfully, starting analysis...', 'job_id': job.id}, to=sid)
+        return jsonify({'message': 'File uploaded and processing started.', 'job_id': job.id,
+                        'customer_id': customer_id}), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    job = analysis_jobs.get(job_id) or chat_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = analysis_jobs.cancel(job_id) or chat_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    # An upload cancelled before it ran never moves its file into place
+    if job.kind == 'analysis' and job.started_at is None and len(job.args) > 1 and os.path.exists(job.args[1]):
+        os.remove(job.args[1])
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs', methods=['GET'])
+def get_scheduler_stats():
+    return jsonify({'analysis': analysis_jobs.stats(), 'chat': chat_jobs.stats(), 'llm': get_llm_client().stats()})
 
-def background_task(file_path):
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify({
+        'local_answers': query_router.stats(),
+        'answer_cache': answer_cache.stats(),
+        'llm': get_llm_client().stats(),
+        'datasets': dataset_store.stats(),
+        'chat_store': chat_store.stats(),
+        'jobs': {'analysis': analysis_jobs.stats(), 'chat': chat_jobs.stats()}
+    })
+
+def background_task(file_path, upload_path=None, sid=None):
     try:
-        df = pd.read_csv(file_path)
+        if upload_path is not None:
+            os.replace(upload_path, file_path)
+        df = load_chat_log(file_path)
 
         # Get customer_id from filename (e.g., CUST001.csv -> customer_id = CUST001)
         customer_id = os.path.splitext(os.path.basename(file_path))[0]
 
-        # Store data in global variable for chat context
-        global uploaded_data
-        uploaded_data = {
-            'customer_id': customer_id,
-            'df': df,
-            'file_path': file_path
-        }
-
-        # Generate visualizations
-        sentiment_plot_path = generate_sentiment_plot(customer_id, df)
-        category_plot_path = generate_category_distribution(customer_id, df)
-        response_time_plot_path = generate_response_time_plot(customer_id, df)
-
-        # Notify frontend that plots are ready
-        socketio.emit('plots_generated', {
-            'sentiment_plot_url': '/' + sentiment_plot_path,
-            'category_plot_url': '/' + category_plot_path,
-            'response_time_plot_url': '/' + response_time_plot_path
-        })
-
-        # Run chat analysis
-        asyncio.run(analyze_customer_chats(socketio, customer_id, df))
+        # Store data (and its precomputed aggregates) for the stats endpoint and chat context
+        dataset = dataset_store.put(customer_id, df, file_path)
+        chat_store.replace(customer_id, df)
+        raise_if_cancelled()
+
+        refresh_customer_outputs(dataset, sid)
+    except JobCancelled:
+        socketio.emit('update', {'message': '⏹️ Analysis cancelled.'}, to=sid)
+        raise
     except Exception as e:
-        socketio.emit('update', {'message': f"❌ Error during analysis: {str(e)}"})
+        socketio.emit('update', {'message': f"❌ Error during analysis: {str(e)}"}, to=sid)
         socketio.emit('chat_response', {
             'message': f"I encountered an error while analyzing the uploaded data: {str(e)}",
             'error': True
-        })
+        }, to=sid)
+
+def refresh_customer_outputs(dataset, sid=None):
+    """Generate a customer's charts and AI summary, sent to socket `sid` (or every client when None)."""
+    customer_id = dataset.customer_id
+    with dataset.lock:
+        df = dataset.df
+        dataset.rendered_aggregates = dataset.aggregates
+
+    # The browser draws charts from the JSON endpoints; PNG exports are only pre-rendered on request
+    if RENDER_PNG_CHARTS:
+        render_customer_charts(customer_id, df)
+        raise_if_cancelled()
+
+    # Notify frontend that chart data is ready
+    socketio.emit('plots_generated', {
+        'customer_id': customer_id,
+        'version': dataset.version,
+        'chart_urls': {kind: f"/api/customer/{customer_id}/charts/{kind}" for kind in CHART_KINDS},
+        # Sent only to the socket that uploaded this customer's file
+        'uploaded': sid is not None
+    }, to=sid)
+
+    # Run chat analysis
+    raise_if_cancelled()
+    get_llm_client().run(analyze_customer_chats(socketio, customer_id, df, sid))
+
+def refresh_task(customer_id):
+    """Regenerate outputs for a dataset that appended chats have changed."""
+    dataset = dataset_store.get_or_load(customer_id, load_customer_file)
+    if dataset is None:
+        return
+    try:
+        refresh_customer_outputs(dataset)
+    except JobCancelled:
+        socketio.emit('update', {'message': '⏹️ Refresh cancelled.'})
+        raise
+    except Exception as e:
+        socketio.emit('update', {'message': f"❌ Error refreshing analysis: {str(e)}"})
+
+def needs_refresh(dataset):
+    """True when charts were never generated or appended chats moved the aggregates past the thresholds."""
+    if dataset.rendered_aggregates is None:
+        return True
+    drift = aggregate_drift(dataset.rendered_aggregates, dataset.aggregates)
+    return (drift['sentiment'] > REGENERATE_SENTIMENT_DELTA
+            or drift['category_share'] > REGENERATE_CATEGORY_SHARE_DELTA
+            or drift['response_time'] > REGENERATE_RESPONSE_TIME_RATIO)
+
+@app.route('/api/customer/<customer_id>/append', methods=['POST'])
+def append_customer_chats(customer_id):
+    """Merge newly arrived chats into an existing customer dataset without reprocessing it."""
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file part'}), 400
+    dataset = dataset_store.get_or_load(customer_id, load_customer_file)
+    if dataset is None:
+        return jsonify({'error': 'Customer data not found, upload the full file first'}), 404
+
+    try:
+        new_rows = apply_types(pd.read_csv(request.files['file']))
+    except Exception as e:
+        return jsonify({'error': f"Could not read CSV: {str(e)}"}), 400
+    missing = [col for col in dataset.df.columns if col not in new_rows.columns]
+    if missing:
+        return jsonify({'error': f"Missing columns: {', '.join(missing)}"}), 400
+    new_rows = new_rows[list(dataset.df.columns)]
+
+    with dataset.lock:
+        # Persist first so the appended chats survive eviction and restarts
+        if dataset.file_path:
+            new_rows.to_csv(dataset.file_path, mode='a', header=False, index=False)
+        dataset_store.append(customer_id, new_rows)
+        chat_store.add(customer_id, new_rows)
+        stats = dataset.stats()
+        refresh = needs_refresh(dataset)
+
+    job_id = None
+    if refresh:
+        try:
+            job_id = analysis_jobs.submit(refresh_task, customer_id, kind='refresh').id
+        except QueueFull:
+            # Aggregates are already current; charts catch up on the next append
+            refresh = False
+
+    socketio.emit('update', {
+        'message': f"📈 {len(new_rows)} new chats merged for {customer_id} ({stats['total_chats']} total)"
+                   + (", refreshing charts and analysis..." if refresh else "."),
+        'job_id': job_id
+    })
+    return jsonify({'appended': int(len(new_rows)), 'stats': stats, 'refreshing': refresh, 'job_id': job_id})
 
 # Gemini chat support with real-time responses and data awareness
 @socketio.on('chat_message')
@@ -91,65 +241,102 @@ def handle_user_chat(data):
     try:
         user_message = data.get('message', '')
         customer_id = data.get('customer_id', None)
+        sid = request.sid
         
         # Create a thread to handle the chat response
         def process_chat():
             try:
+                started = time.perf_counter()
+                # Use the dataset the user is looking at, falling back to the latest upload
+                if customer_id:
+                    dataset = dataset_store.get_or_load(customer_id, load_customer_file)
+                else:
+                    dataset = dataset_store.latest()
+
                 # Check if we have data to reference
-                if uploaded_data and 'df' in uploaded_data and 'customer_id' in uploaded_data:
-                    df = uploaded_data['df']
-                    current_customer_id = uploaded_data['customer_id']
+                if dataset is not None:
+                    current_customer_id = dataset.customer_id
+                    version = dataset.version
+
+                    # Aggregate questions are answered exactly from the data; repeated
+                    # (or near-identical) questions about the same data come from cache
+                    local_answer = query_router.answer(dataset, user_message)
+                    source = 'local'
+                    if local_answer is None:
+                        # Names and dates the question mentions; a similar cached question must share them
+                        entities = dataset.summary.question_filter(user_message)[1]
+                        local_answer = answer_cache.get(current_customer_id, version, user_message, entities)
+                        source = 'cache'
+                    if local_answer is not None:
+                        elapsed_ms = (time.perf_counter() - started) * 1000
+                        socketio.emit('chat_complete', {
+                            'stream_id': uuid.uuid4().hex,
+                            'message': local_answer,
+                            'source': source,
+                            'ttft_ms': elapsed_ms,
+                            'total_ms': elapsed_ms,
+                            'timestamp': pd.Timestamp.now().isoformat()
+                        }, to=sid)
+                        return
+
+                    # Precomputed summary plus only the rows this question mentions
+                    data_context = dataset.summary.prompt_context(user_message)
                     
                     # Create a context-aware prompt
                     stats_context = f"""
                     You are an AI assistant helping with customer service chat analysis. You have access to the following data for customer {current_customer_id}:
                     
-                    Summary statistics:
-                    - Total chats: {len(df)}
-                    - Average sentiment score: {df['Sentiment_Score'].mean():.2f} (range: -1 to 1)
-                    - Most common category: {df['Category'].value_counts().index[0]}
-                    - Average response time: {df['Response_Time_Minutes'].mean():.2f} minutes
-                    - Date range: {df['Date'].min()} to {df['Date'].max()}
-                    
-                    Full data (first few rows):
-                    {df.head().to_string()}
+                    {data_context}
                     
                     The user is asking: {user_message}
                     
                     Provide a helpful, accurate response based on this customer service data. If they ask about specific dates, categories, sentiment scores, or response times, look at the data and give precise answers.
                     """
                     
-                    # Generate response from Gemini with context
-                    response = client.models.generate_content(
-                        model="gemini-1.5-flash-8b",
-                        contents=stats_context
-                    )
+                    prompt = stats_context
                 else:
                     # No data available, inform the user
                     if "sentiment" in user_message.lower() or "customer" in user_message.lower() or "chat" in user_message.lower():
-                        response_text = "I don't have any customer data to analyze yet. Please upload a CSV file first."
-                    else:
-                        # Generate a general response
-                        response = client.models.generate_content(
-                            model="gemini-1.5-flash-8b",
-                            contents=f"The user asks: {user_message}. Respond helpfully but if they ask about customer data, explain that they need to upload a CSV file first."
-                        )
-                        response_text = response.text
-                
-                # Send response back to client
-                socketio.emit('chat_response', {
-                    'message': response.text if 'response' in locals() and hasattr(response, 'text') else response_text,
+                        socketio.emit('chat_response', {
+                            'message': "I don't have any customer data to analyze yet. Please upload a CSV file first.",
+                            'timestamp': pd.Timestamp.now().isoformat()
+                        }, to=sid)
+                        return
+                    # Generate a general response
+                    prompt = f"The user asks: {user_message}. Respond helpfully but if they ask about customer data, explain that they need to upload a CSV file first."
+
+                # Stream the response back to the client that asked, chunk by chunk
+                stream_id = uuid.uuid4().hex
+
+                def send_token(token):
+                    socketio.emit('chat_token', {'stream_id': stream_id, 'token': token}, to=sid)
+
+                result = get_llm_client().stream_sync(prompt, send_token)
+                socketio.emit('chat_complete', {
+                    'stream_id': stream_id,
+                    'message': result['text'],
+                    'ttft_ms': result['ttft'] * 1000 if result['ttft'] is not None else None,
+                    'total_ms': result['total'] * 1000,
                     'timestamp': pd.Timestamp.now().isoformat()
-                })
+                }, to=sid)
+                if dataset is not None and result['text']:
+                    answer_cache.put(current_customer_id, version, user_message, result['text'], entities)
             except Exception as e:
                 socketio.emit('chat_response', {
                     'message': f"Error generating response: {str(e)}",
                     'error': True
-                })
+                }, to=sid)
         
-        # Start processing in a separate thread
-        threading.Thread(target=process_chat).start()
-        return {'status': 'processing'}
+        # Queue the response on the bounded chat worker pool
+        try:
+            job = chat_jobs.submit(process_chat, kind='chat')
+        except QueueFull:
+            emit('chat_response', {
+                'message': "The assistant is busy right now, please try again in a moment.",
+                'error': True
+            })
+            return {'status': 'busy'}
+        return {'status': 'processing', 'job_id': job.id}
     
     except Exception as e:
         return {'status': 'error', 'message': str(e)}
@@ -158,28 +345,85 @@ def handle_user_chat(data):
 @app.route('/api/customer/<customer_id>/stats', methods=['GET'])
 def get_customer_stats(customer_id):
     try:
-        # Find the customer's data file
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{customer_id}.csv")
+        # Serve precomputed aggregates; only hit the disk if the dataset is not in memory
+        dataset = dataset_store.get_or_load(customer_id, load_customer_file)
         
-        if not os.path.exists(file_path):
+        if dataset is None:
             return jsonify({'error': 'Customer data not found'}), 404
-            
-        # Load and analyze data
-        df = pd.read_csv(file_path)
-        stats = {
-            'customer_id': customer_id,
-            'total_chats': len(df),
-            'average_sentiment': float(df['Sentiment_Score'].mean()),
-            'positive_chats': int(len(df[df['Sentiment_Score'] > 0.3])),
-            'negative_chats': int(len(df[df['Sentiment_Score'] < -0.3])),
-            'top_category': df['Category'].value_counts().index[0],
-            'avg_response_time': float(df['Response_Time_Minutes'].mean())
-        }
         
+        stats = dataset.stats()
+        # A date range adds a trend from the finest rollup that fits max_points buckets
+        start, end = request.args.get('start'), request.args.get('end')
+        if start or end:
+            max_points = max(1, int(request.args.get('max_points', CHART_MAX_POINTS)))
+            resolution, table = dataset.rollups.select(start, end, max_points)
+            stats['range'] = dict(summarize(table), start=start, end=end)
+            stats['trend'] = {'resolution': resolution, 'buckets': table_records(table)}
         return jsonify(stats)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _day_key(value):
+    # Raises ValueError for an unparseable date (reported as a 400)
+    return pd.Timestamp(value).strftime('%Y-%m-%d') if value else None
+
+@app.route('/api/customer/<customer_id>/charts/<kind>', methods=['GET'])
+def get_chart_data(customer_id, kind):
+    """Compact, downsampled series for one chart, for drawing in the browser."""
+    if kind not in CHART_KINDS:
+        return jsonify({'error': f"Unknown chart kind: {kind}"}), 404
+    dataset = dataset_store.get_or_load(customer_id, load_customer_file)
+    if dataset is None:
+        return jsonify({'error': 'Customer data not found'}), 404
+    start, end = request.args.get('start'), request.args.get('end')
+    try:
+        max_points = max(3, min(int(request.args.get('max_points', CHART_MAX_POINTS)), 10000))
+        # Rollup buckets start at midnight, so only the day of start/end changes the series;
+        # category/response-time charts ignore the range entirely
+        if kind == 'sentiment':
+            key = (kind, max_points, _day_key(start), _day_key(end))
+        else:
+            key = (kind,)
+        data = dataset.memo(('chart',) + key, lambda df: build_chart_data(
+            df, kind, max_points, rollups=dataset.rollups, start=start, end=end))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(data, customer_id=customer_id, version=dataset.version))
+
+@app.route('/api/customer/<customer_id>/charts/<kind>.png', methods=['GET'])
+def export_chart_png(customer_id, kind):
+    """Server-rendered PNG of one chart (cached by content hash), for downloads and reports."""
+    if kind not in CHART_KINDS:
+        return jsonify({'error': f"Unknown chart kind: {kind}"}), 404
+    dataset = dataset_store.get_or_load(customer_id, load_customer_file)
+    if dataset is None:
+        return jsonify({'error': 'Customer data not found'}), 404
+    path = render_customer_charts(customer_id, dataset.df, charts=[kind])[kind]
+    return send_file(os.path.abspath(path), mimetype='image/png')
+
+def _leaderboard(group_col, default_sort, default_ascending):
+    sort_by = request.args.get('sort', default_sort)
+    order = request.args.get('order')
+    ascending = default_ascending if order is None else order == 'asc'
+    try:
+        limit = int(request.args.get('limit', 10))
+        min_chats = int(request.args.get('min_chats', 1))
+        rows = chat_store.top(group_col, sort_by, limit, ascending, min_chats)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'sort': sort_by, 'order': 'asc' if ascending else 'desc', 'rows': rows})
+
+# Dashboards across all customers, served from the pre-aggregated chat store
+@app.route('/api/operators/leaderboard', methods=['GET'])
+def get_operator_leaderboard():
+    return _leaderboard('Operator_Name', 'avg_sentiment', False)
+
+@app.route('/api/customers/top', methods=['GET'])
+def get_top_customers():
+    return _leaderboard('Customer_Name', 'total_chats', False)
+
 if __name__ == '__main__':
     # Create necessary directories
     os.makedirs('static/sentiment_charts', exist_ok=True)
@@ -187,6 +431,9 @@ if __name__ == '__main__':
     os.makedirs('static/response_time_charts', exist_ok=True)
     os.makedirs('templates', exist_ok=True)
     os.makedirs('uploads', exist_ok=True)
-    
+
+    # Operator/customer leaderboards start from every earlier upload
+    analysis_jobs.submit(chat_store.rebuild, app.config['UPLOAD_FOLDER'], load_chat_log, kind='rebuild')
+
     # Start the application
     socketio.run(app, debug=True)
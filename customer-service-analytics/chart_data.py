@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from rollups import Rollups
+
+CHART_KINDS = ('sentiment', 'category', 'response_time')
+DEFAULT_MAX_POINTS = 500
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the point
+    kept from the previous bucket and the average of the next bucket. This
+    preserves peaks and troughs far better than taking every n-th point.
+
+    Parameters:
+    x, y (array-like): Points sorted by x (numeric)
+    threshold (int): Number of points to keep
+
+    Returns:
+    ndarray: Indices of the kept points, in ascending order
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)  # Bucket boundaries, excluding first and last point
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        # Twice the triangle area for every candidate in the bucket at once
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[i + 1] = previous
+    return kept
+
+
+def sentiment_chart(customer_data, max_points=DEFAULT_MAX_POINTS, rollups=None, start=None, end=None):
+    """
+    Sentiment trend from the finest daily/weekly/monthly rollup that fits in
+    max_points buckets over [start, end]; monthly buckets beyond that are
+    downsampled with LTTB.
+
+    Parameters:
+    rollups (Rollups): The dataset's maintained rollups (built from customer_data when omitted)
+
+    Returns:
+    dict: 'labels' (bucket start dates), 'values' (mean), 'min', 'max', 'counts',
+          'resolution', 'average' and 'total_points' (buckets before downsampling)
+    """
+    rollups = rollups or Rollups(customer_data)
+    resolution, table = rollups.select(start, end, max_points)
+    table = table[table['sentiment_count'] > 0]
+    total_points = len(table)
+    table = table.iloc[lttb(table.index.asi8, table['sentiment_mean'].to_numpy(), max_points)]
+    scored = table['sentiment_count']
+    return {
+        'labels': table.index.strftime('%Y-%m-%d').tolist(),
+        'values': table['sentiment_mean'].round(3).tolist(),
+        'min': table['sentiment_min'].round(3).tolist(),
+        'max': table['sentiment_max'].round(3).tolist(),
+        'counts': scored.astype(int).tolist(),
+        'resolution': resolution,
+        'average': round(float((table['sentiment_mean'] * scored).sum() / scored.sum()), 3) if scored.sum() else None,
+        'total_points': total_points
+    }
+
+
+def category_chart(customer_data, max_points=None, **options):
+    """Chat count per category, largest first."""
+    counts = customer_data['Category'].value_counts()
+    counts = counts[counts > 0]
+    return {'labels': counts.index.astype(str).tolist(), 'values': counts.astype(int).tolist()}
+
+
+def response_time_chart(customer_data, max_points=None, **options):
+    """Average response time per category, slowest first."""
+    response_time = pd.to_numeric(customer_data['Response_Time_Minutes'], errors='coerce')
+    averages = response_time.groupby(customer_data['Category'].astype(str)).mean().dropna().sort_values(ascending=False)
+    return {'labels': averages.index.tolist(), 'values': averages.round(2).tolist()}
+
+
+_BUILDERS = {
+    'sentiment': sentiment_chart,
+    'category': category_chart,
+    'response_time': response_time_chart
+}
+
+
+def build_chart_data(customer_data, kind, max_points=DEFAULT_MAX_POINTS, **options):
+    """
+    Compact series for one chart kind, ready to serialize as JSON.
+
+    Extra options (rollups, start, end) are used by the sentiment chart.
+
+    Raises:
+    ValueError: For an unknown kind
+    """
+    if kind not in _BUILDERS:
+        raise ValueError(f"Unknown chart kind: {kind} (expected one of {', '.join(CHART_KINDS)})")
+    return dict(_BUILDERS[kind](customer_data, max_points, **options), kind=kind)
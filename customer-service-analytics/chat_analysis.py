@@ -1,13 +1,7 @@
-import os
 import asyncio
-from dotenv import load_dotenv
-from flask_socketio import SocketIO
-from google import genai
+from llm_client import get_llm_client
 
-# Load environment variables from .env file
-load_dotenv()
-
-async def analyze_customer_chats(socketio, customer_id, customer_data):
+async def analyze_customer_chats(socketio, customer_id, customer_data, sid=None):
     """
     Run analysis on customer service chat data and send updates via SocketIO.
     
@@ -15,17 +9,11 @@ async def analyze_customer_chats(socketio, customer_id, customer_data):
     socketio: SocketIO instance for real-time communication
     customer_id: Customer identifier
     customer_data: DataFrame containing customer chat data
+    sid: Socket to send the updates to, or None to broadcast them
     """
     try:
         # Emit status update
-        socketio.emit('update', {'message': '🟢 Starting customer chat analysis...'})
-        
-        # Get API key from environment
-        gemini_api_key = os.environ.get("GEMINI_API_KEY")
-        
-        # Create Gemini client
-        client = genai.Client(api_key=gemini_api_key)
-        model = "gemini-1.5-flash-8b"
+        socketio.emit('update', {'message': '🟢 Starting customer chat analysis...'}, to=sid)
         
         # Create analysis prompt with customer data
         avg_sentiment = customer_data["Sentiment_Score"].mean()
@@ -62,29 +50,24 @@ async def analyze_customer_chats(socketio, customer_id, customer_data):
         Format your response in clear sections with headers.
         """
         
-        socketio.emit('update', {'message': '🧠 Generating customer service analysis...'})
-        
-        # Generate analysis using Gemini
-        response = client.models.generate_content(
-            model=model,
-            contents=analysis_prompt
-        )
+        socketio.emit('update', {'message': '🧠 Generating customer service analysis...'}, to=sid)
         
-        analysis = response.text
+        # Generate analysis using the shared Gemini client
+        analysis = await get_llm_client().generate(analysis_prompt)
         
         # Send updates
-        socketio.emit('update', {'message': '📊 Analysis complete!'})
+        socketio.emit('update', {'message': '📊 Analysis complete!'}, to=sid)
         
         # Send final analysis
         socketio.emit('analysis_complete', {
             'customer_id': customer_id,
             'analysis': analysis
-        })
+        }, to=sid)
         
         return analysis
         
     except Exception as e:
-        socketio.emit('update', {'message': f"❌ Error in analysis: {str(e)}"})
+        socketio.emit('update', {'message': f"❌ Error in analysis: {str(e)}"}, to=sid)
         return f"Error: {str(e)}"
 
 # For standalone testing
@@ -103,7 +86,7 @@ if __name__ == '__main__':
     
     # Mock SocketIO
     class MockSocketIO:
-        def emit(self, event, data):
+        def emit(self, event, data, to=None):
             print(f"Event: {event}, Data: {data}")
     
     # Run test
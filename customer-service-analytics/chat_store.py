@@ -0,0 +1,143 @@
+import os
+import threading
+import pandas as pd
+
+# Dimensions the dashboards rank by
+GROUP_COLUMNS = ('Operator_Name', 'Customer_Name')
+
+# Mergeable partial aggregates: every column is a sum, so tables can be added and subtracted
+PARTIAL_COLUMNS = ['total_chats', 'sentiment_sum', 'sentiment_count', 'positive_chats',
+                   'negative_chats', 'response_time_sum', 'response_time_count']
+
+SORT_FIELDS = ('total_chats', 'avg_sentiment', 'avg_response_time', 'positive_chats', 'negative_chats')
+
+
+def partial_aggregates(df, group_col):
+    """
+    Per-group sums and counts for one batch of chat rows.
+
+    Returns:
+    DataFrame: Indexed by group_col with the PARTIAL_COLUMNS columns
+    """
+    sentiment = pd.to_numeric(df['Sentiment_Score'], errors='coerce')
+    response_time = pd.to_numeric(df['Response_Time_Minutes'], errors='coerce')
+    frame = pd.DataFrame({
+        group_col: df[group_col].astype(str).to_numpy(),
+        'total_chats': 1,
+        'sentiment_sum': sentiment.fillna(0).to_numpy(),
+        'sentiment_count': sentiment.notna().to_numpy(dtype=int),
+        'positive_chats': (sentiment > 0.3).to_numpy(dtype=int),
+        'negative_chats': (sentiment < -0.3).to_numpy(dtype=int),
+        'response_time_sum': response_time.fillna(0).to_numpy(),
+        'response_time_count': response_time.notna().to_numpy(dtype=int)
+    })
+    return frame.groupby(group_col, sort=False)[PARTIAL_COLUMNS].sum()
+
+
+def _empty_table(group_col):
+    return pd.DataFrame(columns=PARTIAL_COLUMNS, index=pd.Index([], name=group_col), dtype=float)
+
+
+class ChatStore:
+    """
+    Consolidated operator and customer aggregates across every uploaded dataset.
+
+    Each dataset's contribution is kept as small per-group partial tables, so
+    replacing a dataset subtracts its old partials and adds the new ones, and
+    an append only groups the new rows. Serving a leaderboard never touches
+    chat rows: it derives averages from the totals table (one row per
+    operator or customer) and sorts that.
+    """
+
+    def __init__(self, group_columns=GROUP_COLUMNS):
+        self.group_columns = tuple(group_columns)
+        self._totals = {col: _empty_table(col) for col in self.group_columns}
+        self._contributions = {}  # dataset_id -> {group_col: partial table}
+        self._lock = threading.Lock()
+
+    def _apply(self, group_col, partial, sign):
+        # Caller holds self._lock
+        totals = self._totals[group_col].add(sign * partial, fill_value=0)
+        self._totals[group_col] = totals[totals['total_chats'] > 0]
+
+    def replace(self, dataset_id, df):
+        """Make df the whole contribution of dataset_id (first upload or re-upload)."""
+        partials = {col: partial_aggregates(df, col) for col in self.group_columns if col in df.columns}
+        with self._lock:
+            previous = self._contributions.pop(dataset_id, {})
+            for col, partial in previous.items():
+                self._apply(col, partial, -1)
+            for col, partial in partials.items():
+                self._apply(col, partial, 1)
+            self._contributions[dataset_id] = partials
+
+    def add(self, dataset_id, new_rows):
+        """Fold rows appended to dataset_id into its contribution and the totals."""
+        partials = {col: partial_aggregates(new_rows, col) for col in self.group_columns if col in new_rows.columns}
+        with self._lock:
+            contribution = self._contributions.setdefault(dataset_id, {})
+            for col, partial in partials.items():
+                contribution[col] = contribution.get(col, _empty_table(col)).add(partial, fill_value=0)
+                self._apply(col, partial, 1)
+
+    def remove(self, dataset_id):
+        with self._lock:
+            for col, partial in self._contributions.pop(dataset_id, {}).items():
+                self._apply(col, partial, -1)
+
+    def rebuild(self, directory, loader):
+        """
+        Load every CSV in directory with loader(path) -> DataFrame and add it,
+        keyed by file name without extension (the customer_id).
+
+        Returns:
+        int: Number of datasets added; files without the grouped columns are skipped
+        """
+        added = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.lower().endswith('.csv'):
+                continue
+            try:
+                df = loader(os.path.join(directory, name))
+            except Exception:
+                continue
+            if not set(self.group_columns) & set(df.columns):
+                continue
+            self.replace(os.path.splitext(name)[0], df)
+            added += 1
+        return added
+
+    def top(self, group_col, sort_by='total_chats', limit=10, ascending=False, min_chats=1):
+        """
+        Top groups by one of SORT_FIELDS.
+
+        Returns:
+        list: One dict per group with its name, chat counts and averages
+        """
+        if group_col not in self._totals:
+            raise ValueError(f"Unknown group column: {group_col}")
+        if sort_by not in SORT_FIELDS:
+            raise ValueError(f"sort_by must be one of {', '.join(SORT_FIELDS)}")
+        with self._lock:
+            totals = self._totals[group_col]
+        totals = totals[totals['total_chats'] >= min_chats]
+
+        table = pd.DataFrame({
+            'total_chats': totals['total_chats'].astype(int),
+            'avg_sentiment': totals['sentiment_sum'] / totals['sentiment_count'].where(totals['sentiment_count'] > 0),
+            'avg_response_time': totals['response_time_sum'] / totals['response_time_count'].where(totals['response_time_count'] > 0),
+            'positive_chats': totals['positive_chats'].astype(int),
+            'negative_chats': totals['negative_chats'].astype(int)
+        })
+        table = table.sort_values(sort_by, ascending=ascending, na_position='last').head(limit)
+        records = table.round(3).reset_index().rename(columns={group_col: 'name'}).to_dict(orient='records')
+        # NaN averages (no scored chats) are not valid JSON
+        return [{k: (None if isinstance(v, float) and v != v else v) for k, v in record.items()} for record in records]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'datasets': len(self._contributions),
+                **{f"{col}_groups": len(table) for col, table in self._totals.items()},
+                'total_chats': int(next(iter(self._totals.values()))['total_chats'].sum()) if self._totals else 0
+            }
@@ -15,5 +15,38 @@ GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 HF_API_KEY = os.getenv('HF_API_KEY', '')
 
+# LLM client settings: per-attempt timeout, retries with jittered backoff, and concurrent calls
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '60'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv('LLM_BACKOFF_BASE_SECONDS', '0.5'))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv('LLM_BACKOFF_MAX_SECONDS', '8'))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+
+# Chat answer cache: lifetime, size, and optional similar-question matching
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv('ANSWER_CACHE_TTL_SECONDS', '900'))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '5000'))
+ANSWER_CACHE_SEMANTIC = os.getenv('ANSWER_CACHE_SEMANTIC', 'false').lower() == 'true'
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', '0.9'))
+
+# Dataset store settings
+DATASET_STORE_MAX_MB = int(os.getenv('DATASET_STORE_MAX_MB', '512'))
+
+# Job scheduler settings: worker threads and how many jobs may wait before requests are rejected
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', '2'))
+ANALYSIS_QUEUE_SIZE = int(os.getenv('ANALYSIS_QUEUE_SIZE', '16'))
+CHAT_WORKERS = int(os.getenv('CHAT_WORKERS', '4'))
+CHAT_QUEUE_SIZE = int(os.getenv('CHAT_QUEUE_SIZE', '64'))
+
+# Chart rendering: worker processes shared by all uploads
+CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', '3'))
+# The dashboard draws charts from JSON; set to pre-render PNG exports on every upload as well
+RENDER_PNG_CHARTS = os.getenv('RENDER_PNG_CHARTS', 'false').lower() == 'true'
+CHART_MAX_POINTS = int(os.getenv('CHART_MAX_POINTS', '500'))
+
+# Appended chats only regenerate charts and the AI summary once aggregates drift past these thresholds
+REGENERATE_SENTIMENT_DELTA = float(os.getenv('REGENERATE_SENTIMENT_DELTA', '0.05'))
+REGENERATE_CATEGORY_SHARE_DELTA = float(os.getenv('REGENERATE_CATEGORY_SHARE_DELTA', '0.05'))
+REGENERATE_RESPONSE_TIME_RATIO = float(os.getenv('REGENERATE_RESPONSE_TIME_RATIO', '0.10'))
+
 # Additional settings
 DEBUG_MODE = os.getenv('DEBUG_MODE', 'false').lower() == 'true'
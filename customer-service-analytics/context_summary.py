@@ -0,0 +1,186 @@
+import re
+import sys
+import numpy as np
+import pandas as pd
+
+# Columns whose values a question may mention by name
+NAME_COLUMNS = ('Category', 'Operator_Name', 'Customer_Name')
+
+MONTHS = {name: i for i, name in enumerate(
+    ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+     'August', 'September', 'October', 'November', 'December'], start=1)}
+MONTHS.update({name[:3]: i for name, i in list(MONTHS.items())})
+
+ISO_DATE = re.compile(r'\b(\d{4})-(\d{1,2})(?:-(\d{1,2}))?\b')
+# Capitalized month names only, so "may" / "march" as ordinary words don't filter by month
+MONTH_DAY = re.compile(r'\b(' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + r')\.?(?:\s+(\d{1,2})(?:st|nd|rd|th)?)?\b')
+
+SENTIMENT_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+class ContextSummary:
+    """
+    Compact description of one customer's chats, built once per dataset version.
+
+    Holds the prompt text every chat message shares (overall figures,
+    per-category and per-week aggregates, sentiment quantiles, outliers) and
+    retrieves the rows a particular question refers to, so prompts no longer
+    recompute statistics or carry an arbitrary df.head().
+    """
+
+    def __init__(self, df, max_weeks=12, outliers=3):
+        self.df = df
+        self.dates = pd.to_datetime(df['Date'], errors='coerce')
+        sentiment = pd.to_numeric(df['Sentiment_Score'], errors='coerce')
+        response_time = pd.to_numeric(df['Response_Time_Minutes'], errors='coerce')
+        frame = pd.DataFrame({
+            'Date': self.dates,
+            'Category': df['Category'].astype(str),
+            'Sentiment_Score': sentiment,
+            'Response_Time_Minutes': response_time
+        })
+
+        self.sentiment_quantiles = sentiment.quantile(list(SENTIMENT_QUANTILES)).to_dict()
+        self.by_category = frame.groupby('Category').agg(
+            chats=('Sentiment_Score', 'size'),
+            avg_sentiment=('Sentiment_Score', 'mean'),
+            avg_response_time=('Response_Time_Minutes', 'mean')
+        ).sort_values('chats', ascending=False)
+        self.by_week = frame.dropna(subset=['Date']).groupby(pd.Grouper(key='Date', freq='W-MON', label='left', closed='left')).agg(
+            chats=('Sentiment_Score', 'size'),
+            avg_sentiment=('Sentiment_Score', 'mean'),
+            avg_response_time=('Response_Time_Minutes', 'mean')
+        ).query('chats > 0').tail(max_weeks)
+        self.outliers = pd.concat([
+            df.loc[sentiment.nsmallest(outliers).index],
+            df.loc[response_time.nlargest(outliers).index]
+        ]).drop_duplicates()
+
+        # Plain numpy columns, so per-question filtering and lookups skip pandas overhead.
+        # Date parts use 0 for missing dates, which no question can match, to fit in small ints
+        self.arrays = {
+            'sentiment': sentiment.to_numpy(dtype=float, na_value=np.nan),
+            'response_time': response_time.to_numpy(dtype=float, na_value=np.nan),
+            'date': self.dates.to_numpy(),
+            'year': self.dates.dt.year.fillna(0).to_numpy(dtype=np.int16),
+            'month': self.dates.dt.month.fillna(0).to_numpy(dtype=np.int8),
+            'day': self.dates.dt.day.fillna(0).to_numpy(dtype=np.int8)
+        }
+
+        # Name columns are kept as integer codes into self.labels rather than a string per row.
+        # Lower-cased value -> (column, original value) for the name lookup in question_filter
+        self.labels = {}
+        self.codes = {}
+        self.names = {}
+        for col in NAME_COLUMNS:
+            if col in df.columns:
+                codes, labels = pd.factorize(df[col].astype(str))
+                self.arrays[col] = codes.astype(np.int32)
+                self.labels[col] = np.asarray(labels, dtype=object)
+                self.codes[col] = {value: code for code, value in enumerate(self.labels[col])}
+                for value in df[col].dropna().astype(str).unique():
+                    self.names[value.lower()] = (col, value)
+        # One alternation for all names (longest first), so a lookup is a single regex scan
+        self._name_pattern = re.compile(
+            r'\b(' + '|'.join(re.escape(name) for name in sorted(self.names, key=len, reverse=True)) + r')\b'
+        ) if self.names else None
+
+        self.text = self._render(frame)
+
+    def _render(self, frame):
+        quantiles = ', '.join(f"p{int(q * 100)} {v:.2f}" for q, v in self.sentiment_quantiles.items())
+        categories = '\n'.join(
+            f"- {row.Index}: {row.chats} chats, avg sentiment {row.avg_sentiment:.2f}, avg response {row.avg_response_time:.1f} min"
+            for row in self.by_category.itertuples()
+        )
+        weeks = '\n'.join(
+            f"- week of {row.Index:%Y-%m-%d}: {row.chats} chats, avg sentiment {row.avg_sentiment:.2f}, avg response {row.avg_response_time:.1f} min"
+            for row in self.by_week.itertuples()
+        )
+        dates = frame['Date'].dropna()
+        date_range = f"from {dates.min():%Y-%m-%d} to {dates.max():%Y-%m-%d}" if len(dates) else "with no valid dates"
+        return (
+            f"Overview: {len(frame)} chats {date_range}; "
+            f"average sentiment {frame['Sentiment_Score'].mean():.2f} (range -1 to 1); "
+            f"average response time {frame['Response_Time_Minutes'].mean():.1f} min.\n"
+            f"Sentiment quantiles: {quantiles}.\n"
+            f"By category:\n{categories}\n"
+            f"By week (most recent {len(self.by_week)}):\n{weeks}\n"
+            f"Outliers (most negative sentiment and slowest responses):\n{self.outliers.to_string(index=False)}"
+        )
+
+    def _date_mask(self, question):
+        arrays = self.arrays
+        mask = np.zeros(len(self.df), dtype=bool)
+        labels = []
+        for year, month, day in ISO_DATE.findall(question):
+            hit = (arrays['year'] == int(year)) & (arrays['month'] == int(month))
+            if day:
+                hit &= arrays['day'] == int(day)
+            mask |= hit
+            labels.append(f"{year}-{int(month):02d}" + (f"-{int(day):02d}" if day else ''))
+        for month_name, day in MONTH_DAY.findall(question):
+            if month_name == 'May' and not day:
+                continue  # Too often just the verb at the start of a question
+            hit = arrays['month'] == MONTHS[month_name]
+            if day:
+                hit &= arrays['day'] == int(day)
+            mask |= hit
+            labels.append(f"{month_name} {day}".strip())
+        return mask, labels
+
+    def question_filter(self, question):
+        """
+        Row mask for the dates, months, categories, operators and customers a question mentions.
+
+        Conditions of the same kind are OR-ed (two dates match either date) and
+        different kinds are AND-ed ("Billing on 2025-05-02" matches both).
+
+        Returns:
+        tuple: (mask, labels) - a boolean array over the rows, or None when the
+               question mentions nothing, and the mentioned values as text
+        """
+        lowered = question.lower()
+        masks = []
+        date_mask, labels = self._date_mask(question)
+        if labels:
+            masks.append(date_mask)
+        mentioned = {}
+        for name in (set(self._name_pattern.findall(lowered)) if self._name_pattern else ()):
+            col, value = self.names[name]
+            mentioned.setdefault(col, []).append(value)
+        for col, values in mentioned.items():
+            masks.append(np.isin(self.arrays[col], [self.codes[col][value] for value in values]))
+            labels = values + labels
+
+        if not masks:
+            return None, []
+        mask = masks[0]
+        for other in masks[1:]:
+            mask = mask & other
+        return mask, labels
+
+    @property
+    def nbytes(self):
+        """Bytes held by the per-row arrays and name labels (the frame itself belongs to the dataset)."""
+        label_bytes = sum(sys.getsizeof(label) for labels in self.labels.values() for label in labels)
+        return sum(array.nbytes for array in self.arrays.values()) + label_bytes
+
+    def relevant_rows(self, question, limit=20):
+        """
+        Rows a question refers to (see question_filter).
+
+        Returns:
+        DataFrame: At most `limit` matching rows; empty when nothing was mentioned
+        """
+        mask, _ = self.question_filter(question)
+        if mask is None:
+            return self.df.iloc[0:0]
+        return self.df[mask].head(limit)
+
+    def prompt_context(self, question, limit=20):
+        """Summary text plus any rows the question refers to, ready to drop into a prompt."""
+        rows = self.relevant_rows(question, limit)
+        if rows.empty:
+            return self.text
+        return f"{self.text}\n\nRows matching the question ({len(rows)} shown):\n{rows.to_string(index=False)}"
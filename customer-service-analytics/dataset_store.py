@@ -0,0 +1,277 @@
+import itertools
+import threading
+from collections import OrderedDict
+import pandas as pd
+from context_summary import ContextSummary
+from rollups import Rollups
+
+# Dataset versions are unique across all customers and uploads, so a customer evicted and
+# uploaded again never reuses a version that cached answers or charts were keyed by
+_versions = itertools.count(1)
+
+# Derived values (chart series, ...) kept per dataset version, least recently used dropped first
+MEMO_MAX_ENTRIES = 64
+
+
+class RunningAggregates:
+    """
+    Mergeable per-customer aggregates served by the stats endpoint and chat prompts.
+
+    Only sums, counts and extremes are kept, so appending rows updates them
+    in O(new rows) instead of recomputing over the whole frame.
+    """
+
+    def __init__(self):
+        self.total_chats = 0
+        self.sentiment_sum = 0.0
+        self.sentiment_count = 0
+        self.positive_chats = 0
+        self.negative_chats = 0
+        self.response_time_sum = 0.0
+        self.response_time_count = 0
+        self.category_counts = {}
+        self.date_min = None
+        self.date_max = None
+
+    @classmethod
+    def from_frame(cls, df):
+        aggregates = cls()
+        aggregates.update(df)
+        return aggregates
+
+    def update(self, df):
+        """
+        Fold new rows into the running totals.
+        
+        Parameters:
+        df (DataFrame): Chat rows with 'Date', 'Sentiment_Score', 'Category'
+                        and 'Response_Time_Minutes' columns
+        """
+        sentiment = pd.to_numeric(df['Sentiment_Score'], errors='coerce')
+        response_time = pd.to_numeric(df['Response_Time_Minutes'], errors='coerce')
+        dates = pd.to_datetime(df['Date'], errors='coerce')
+
+        self.total_chats += int(len(df))
+        self.sentiment_sum += float(sentiment.sum())
+        self.sentiment_count += int(sentiment.count())
+        self.positive_chats += int((sentiment > 0.3).sum())
+        self.negative_chats += int((sentiment < -0.3).sum())
+        self.response_time_sum += float(response_time.sum())
+        self.response_time_count += int(response_time.count())
+        for category, count in df['Category'].value_counts().items():
+            if count > 0:
+                self.category_counts[str(category)] = self.category_counts.get(str(category), 0) + int(count)
+        if dates.notna().any():
+            low, high = dates.min(), dates.max()
+            self.date_min = low if self.date_min is None else min(self.date_min, low)
+            self.date_max = high if self.date_max is None else max(self.date_max, high)
+
+    def to_dict(self):
+        """
+        Returns:
+        dict: Derived aggregates as plain Python values, safe to serialize as JSON
+        """
+        category_counts = dict(sorted(self.category_counts.items(), key=lambda item: -item[1]))
+        return {
+            'total_chats': self.total_chats,
+            'average_sentiment': self.sentiment_sum / self.sentiment_count if self.sentiment_count else float('nan'),
+            'positive_chats': self.positive_chats,
+            'negative_chats': self.negative_chats,
+            'category_counts': category_counts,
+            'top_category': next(iter(category_counts), None),
+            'avg_response_time': self.response_time_sum / self.response_time_count if self.response_time_count else float('nan'),
+            'date_min': self.date_min.strftime('%Y-%m-%d') if self.date_min is not None else None,
+            'date_max': self.date_max.strftime('%Y-%m-%d') if self.date_max is not None else None
+        }
+
+
+def aggregate_drift(before, after):
+    """
+    How far aggregates have moved since charts and summaries were last generated.
+
+    Parameters:
+    before (dict), after (dict): Outputs of RunningAggregates.to_dict()
+
+    Returns:
+    dict: 'sentiment' (absolute change in mean sentiment), 'category_share'
+          (largest absolute change in any category's share of chats) and
+          'response_time' (relative change in mean response time)
+    """
+    def shares(aggregates):
+        total = aggregates['total_chats'] or 1
+        return {k: v / total for k, v in aggregates['category_counts'].items()}
+
+    before_shares, after_shares = shares(before), shares(after)
+    categories = set(before_shares) | set(after_shares)
+    old_rt, new_rt = before['avg_response_time'], after['avg_response_time']
+    return {
+        'sentiment': abs(after['average_sentiment'] - before['average_sentiment']),
+        'category_share': max((abs(after_shares.get(c, 0) - before_shares.get(c, 0)) for c in categories), default=0.0),
+        'response_time': abs(new_rt - old_rt) / abs(old_rt) if old_rt else float(new_rt != old_rt)
+    }
+
+
+class CustomerDataset:
+    """One customer's parsed chat frame plus everything precomputed from it."""
+
+    def __init__(self, customer_id, df, file_path=None, on_resize=None):
+        self.customer_id = customer_id
+        self.df = df
+        self.file_path = file_path
+        self.version = next(_versions)
+        self.lock = threading.RLock()
+        self.running = RunningAggregates.from_frame(df)
+        self.aggregates = self.running.to_dict()
+        # Prompt context for chat messages, built here so no message has to recompute it
+        self._summary = ContextSummary(df)
+        # Daily/weekly/monthly sentiment and response-time buckets for trends
+        self.rollups = Rollups(df)
+        # Aggregates as of the last chart/summary generation; None until generated
+        self.rendered_aggregates = None
+        self._memo = OrderedDict()
+        # Called with the customer_id when a lazily built part changes the entry's size
+        self.on_resize = on_resize
+        self.nbytes = self.measure()
+
+    def append(self, new_rows):
+        """Merge new rows into the frame and update the aggregates incrementally."""
+        with self.lock:
+            self.df = pd.concat([self.df, new_rows], ignore_index=True)
+            self.running.update(new_rows)
+            self.aggregates = self.running.to_dict()
+            # Rebuilt on the next chat message rather than on every append (see summary)
+            self._summary = None
+            self.rollups.update(new_rows)
+            self._memo.clear()
+            self.version = next(_versions)
+
+    def measure(self):
+        """Bytes held by the frame, the rollups and the context summary's arrays, for the store's memory budget."""
+        summary_bytes = self._summary.nbytes if self._summary is not None else 0
+        return int(self.df.memory_usage(deep=True).sum()) + self.rollups.nbytes + summary_bytes
+
+    @property
+    def summary(self):
+        """The ContextSummary of the current frame, rebuilt on first use after an append."""
+        with self.lock:
+            if self._summary is None:
+                self._summary = ContextSummary(self.df)
+                if self.on_resize is not None:
+                    self.on_resize(self.customer_id)
+            return self._summary
+
+    def memo(self, key, build):
+        """
+        Value derived from the current frame by build(df), computed once per version.
+
+        At most MEMO_MAX_ENTRIES values are kept, so keys built from request
+        parameters can't grow the memo without bound.
+        """
+        with self.lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+            value = self._memo[key] = build(self.df)
+            while len(self._memo) > MEMO_MAX_ENTRIES:
+                self._memo.popitem(last=False)
+            return value
+
+    def stats(self):
+        aggregates = self.aggregates
+        return {
+            'customer_id': self.customer_id,
+            'total_chats': aggregates['total_chats'],
+            'average_sentiment': aggregates['average_sentiment'],
+            'positive_chats': aggregates['positive_chats'],
+            'negative_chats': aggregates['negative_chats'],
+            'top_category': aggregates['top_category'],
+            'avg_response_time': aggregates['avg_response_time']
+        }
+
+
+class DatasetStore:
+    """
+    Thread-safe in-memory store of customer datasets keyed by customer_id.
+
+    Entries are kept in least-recently-used order and evicted once their
+    combined frame size exceeds `max_bytes`. The most recently stored entry
+    is never evicted, even when it alone is larger than the budget.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._latest_customer_id = None
+        self._lock = threading.Lock()
+
+    def get(self, customer_id):
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is not None:
+                self._entries.move_to_end(customer_id)
+            return entry
+
+    def put(self, customer_id, df, file_path=None):
+        """Store (or replace) a customer's dataset; aggregates are computed before the lock is taken."""
+        entry = CustomerDataset(customer_id, df, file_path, on_resize=self.resize)
+        with self._lock:
+            previous = self._entries.pop(customer_id, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._entries[customer_id] = entry
+            self._bytes += entry.nbytes
+            self._latest_customer_id = customer_id
+            self._evict()
+        return entry
+
+    def get_or_load(self, customer_id, loader):
+        """Return the cached dataset, or load it with loader(customer_id) -> (df, file_path) on a miss."""
+        entry = self.get(customer_id)
+        if entry is not None:
+            return entry
+        loaded = loader(customer_id)
+        if loaded is None:
+            return None
+        df, file_path = loaded
+        return self.put(customer_id, df, file_path)
+
+    def append(self, customer_id, new_rows):
+        """Append rows to a stored dataset; returns the entry, or None if it is not in memory."""
+        entry = self.get(customer_id)
+        if entry is None:
+            return None
+        entry.append(new_rows)
+        self.resize(customer_id)
+        return entry
+
+    def resize(self, customer_id):
+        """Re-measure an entry after its frame changed in place."""
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is None:
+                return
+            nbytes = entry.measure()
+            self._bytes += nbytes - entry.nbytes
+            entry.nbytes = nbytes
+            self._evict()
+
+    def latest(self):
+        """The most recently uploaded dataset, if it is still in memory."""
+        with self._lock:
+            customer_id = self._latest_customer_id
+        return self.get(customer_id) if customer_id is not None else None
+
+    def _evict(self):
+        # Caller holds self._lock
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            customer_id, entry = next(iter(self._entries.items()))
+            if customer_id == self._latest_customer_id:
+                self._entries.move_to_end(customer_id)
+                customer_id, entry = next(iter(self._entries.items()))
+            del self._entries[customer_id]
+            self._bytes -= entry.nbytes
+
+    def stats(self):
+        with self._lock:
+            return {'datasets': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
@@ -0,0 +1,166 @@
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+_current = threading.local()
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the scheduler's queue is full."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancellation has been requested."""
+
+
+class Job:
+    def __init__(self, kind, func, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'queue_seconds': (self.started_at or time.time()) - self.created_at,
+            'run_seconds': ((self.finished_at or time.time()) - self.started_at) if self.started_at else None
+        }
+
+
+def current_job():
+    """The job running on this worker thread, or None outside a scheduler."""
+    return getattr(_current, 'job', None)
+
+
+def raise_if_cancelled():
+    """Cooperative cancellation point for long-running job functions."""
+    job = current_job()
+    if job is not None and job.cancelled:
+        raise JobCancelled(job.id)
+
+
+class JobScheduler:
+    """
+    Bounded worker pool with a bounded job queue.
+
+    At most `max_workers` jobs run at once and at most `max_queue` wait;
+    submitting beyond that raises QueueFull so callers can push back (e.g.
+    with HTTP 429) instead of piling up threads. Queued jobs can be cancelled
+    outright; running jobs are cancelled cooperatively via raise_if_cancelled().
+    Worker threads start with the first submitted job, so constructing a
+    scheduler at import time (e.g. in a re-imported main module) starts nothing.
+    """
+
+    def __init__(self, name, max_workers=4, max_queue=32, history=1000):
+        self.name = name
+        self.history = history
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"{name}-worker-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        self._started = False
+
+    def submit(self, func, *args, kind=None, **kwargs):
+        job = Job(kind or func.__name__, func, args, kwargs)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFull(f"{self.name} queue is full ({self._queue.maxsize} jobs waiting)")
+            self._jobs[job.id] = job
+            self._trim_history()
+            if not self._started:
+                for worker in self._workers:
+                    worker.start()
+                self._started = True
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Request cancellation; returns the job, or None if it is unknown."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel_event.set()
+        with self._lock:
+            if job.status == QUEUED:
+                job.status = CANCELLED
+                job.finished_at = time.time()
+        return job
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            'workers': len(self._workers),
+            'queued': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'running': statuses.count(RUNNING)
+        }
+
+    def _trim_history(self):
+        # Caller holds self._lock; forget the oldest finished jobs
+        while len(self._jobs) > self.history:
+            oldest_id = next((jid for jid, j in self._jobs.items() if j.status not in (QUEUED, RUNNING)), None)
+            if oldest_id is None:
+                break
+            del self._jobs[oldest_id]
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                with self._lock:
+                    if job.status == CANCELLED:
+                        continue
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                _current.job = job
+                try:
+                    job.result = job.func(*job.args, **job.kwargs)
+                    status = CANCELLED if job.cancelled else DONE
+                except JobCancelled:
+                    status = CANCELLED
+                except Exception as e:
+                    job.error = str(e)
+                    status = FAILED
+                finally:
+                    _current.job = None
+                with self._lock:
+                    job.status = status
+                    job.finished_at = time.time()
+            finally:
+                self._queue.task_done()
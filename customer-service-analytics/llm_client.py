@@ -0,0 +1,182 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from google import genai
+from google.genai import errors
+from config import (GEMINI_API_KEY, DEFAULT_MODEL, LLM_TIMEOUT_SECONDS, LLM_MAX_RETRIES,
+                    LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_MAX_SECONDS, LLM_MAX_CONCURRENCY)
+
+# HTTP status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error):
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    # Network errors from the HTTP layer (httpx/aiohttp) don't share a base class
+    return type(error).__module__.split('.')[0] in ('httpx', 'aiohttp')
+
+
+class LLMClient:
+    """
+    One Gemini client shared by the whole server.
+
+    All calls run on a single background event loop, so the async HTTP
+    connection pool of `client.aio` is reused across requests instead of
+    opening a new TLS connection per analysis. Coroutines awaited from any
+    other loop (or thread) are forwarded to that loop. Every call gets a
+    timeout, and retryable failures are retried with jittered exponential
+    backoff.
+    """
+
+    def __init__(self, api_key=GEMINI_API_KEY, model=DEFAULT_MODEL, timeout=LLM_TIMEOUT_SECONDS,
+                 max_retries=LLM_MAX_RETRIES, backoff_base=LLM_BACKOFF_BASE_SECONDS,
+                 backoff_max=LLM_BACKOFF_MAX_SECONDS, max_concurrency=LLM_MAX_CONCURRENCY):
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client = genai.Client(api_key=api_key)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='llm-client-loop', daemon=True)
+        self._thread.start()
+        self._semaphore = self.run(self._make_semaphore(max_concurrency))
+        self.metrics = {'calls': 0, 'retries': 0, 'failures': 0, 'streams': 0}
+        self._ttfts = deque(maxlen=500)  # Recent time-to-first-token samples, in seconds
+
+    @staticmethod
+    async def _make_semaphore(limit):
+        # Created on the client loop so it is bound to it
+        return asyncio.Semaphore(limit)
+
+    def run(self, coro):
+        """Run a coroutine on the client loop and block until it finishes (for worker threads)."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _on_loop(self, coro):
+        # Await coro on the client loop, whichever loop the caller is on
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    def _backoff(self, attempt):
+        # "Full jitter": sleep a random time up to the capped exponential delay
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _generate(self, contents, model, timeout):
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    self.metrics['calls'] += 1
+                    response = await asyncio.wait_for(
+                        self._client.aio.models.generate_content(model=model, contents=contents),
+                        timeout
+                    )
+                return response.text
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self.metrics['failures'] += 1
+                    raise
+                self.metrics['retries'] += 1
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+
+    async def generate(self, contents, model=None, timeout=None):
+        """
+        Generate a completion and return its text.
+
+        Parameters:
+        contents: Prompt text (or any contents accepted by generate_content)
+        model (str): Model name, defaults to DEFAULT_MODEL
+        timeout (float): Seconds allowed per attempt, defaults to LLM_TIMEOUT_SECONDS
+        """
+        return await self._on_loop(self._generate(contents, model or self.model, timeout or self.timeout))
+
+    def generate_sync(self, contents, model=None, timeout=None):
+        """Blocking generate() for code running on worker threads."""
+        return self.run(self.generate(contents, model, timeout))
+
+    async def _consume_stream(self, contents, model, on_token, result):
+        stream = await self._client.aio.models.generate_content_stream(model=model, contents=contents)
+        async for chunk in stream:
+            text = chunk.text
+            if not text:
+                continue
+            if result['ttft'] is None:
+                result['ttft'] = time.perf_counter() - result['started']
+            result['parts'].append(text)
+            on_token(text)
+
+    async def _stream(self, contents, model, timeout, on_token):
+        attempt = 0
+        while True:
+            result = {'started': time.perf_counter(), 'ttft': None, 'parts': []}
+            try:
+                async with self._semaphore:
+                    self.metrics['calls'] += 1
+                    await asyncio.wait_for(self._consume_stream(contents, model, on_token, result), timeout)
+                break
+            except Exception as e:
+                # Tokens already forwarded can't be taken back, so only retry before the first one
+                if result['parts'] or attempt >= self.max_retries or not is_retryable(e):
+                    self.metrics['failures'] += 1
+                    raise
+                self.metrics['retries'] += 1
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+
+        self.metrics['streams'] += 1
+        if result['ttft'] is not None:
+            self._ttfts.append(result['ttft'])
+        return {
+            'text': ''.join(result['parts']),
+            'ttft': result['ttft'],
+            'total': time.perf_counter() - result['started']
+        }
+
+    async def stream(self, contents, on_token, model=None, timeout=None):
+        """
+        Stream a completion, calling on_token(text) for each chunk as it arrives.
+
+        on_token runs on the client loop thread and must not block.
+
+        Returns:
+        dict: 'text' (full completion), 'ttft' (seconds until the first token
+              of the successful attempt) and 'total' (seconds for that attempt)
+        """
+        return await self._on_loop(self._stream(contents, model or self.model, timeout or self.timeout, on_token))
+
+    def stream_sync(self, contents, on_token, model=None, timeout=None):
+        """Blocking stream() for code running on worker threads."""
+        return self.run(self.stream(contents, on_token, model, timeout))
+
+    def stats(self):
+        stats = dict(self.metrics)
+        ttfts = sorted(self._ttfts)
+        if ttfts:
+            stats['ttft_p50_ms'] = ttfts[len(ttfts) // 2] * 1000
+            stats['ttft_p90_ms'] = ttfts[min(len(ttfts) - 1, int(len(ttfts) * 0.9))] * 1000
+        return stats
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_llm_client():
+    """The process-wide LLMClient, created on first use."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = LLMClient()
+        return _shared_client
@@ -0,0 +1,178 @@
+import re
+import threading
+import time
+import numpy as np
+import pandas as pd
+from context_summary import ISO_DATE, MONTH_DAY
+
+# Questions asking for judgement or advice always go to the LLM
+OPEN_ENDED = re.compile(r'\b(why|how (?:can|could|should|do|to)|recommend\w*|suggest\w*|improve\w*|explain\w*|advice|analy[sz]e|summar\w*|insight\w*|compare|trends?|patterns?)\b')
+
+AVERAGE = re.compile(r'\b(average|mean|avg|typical)\b')
+# Only counts of chats themselves: "how many operators/customers" is a different question
+COUNT = re.compile(r'\b(?:how many|number of|count of|total)\s+'
+                   r'(?:(?!operators?\b|customers?\b|agents?\b|categor)\w+\s+){0,3}?(?:chats?|conversations?)\b')
+TOP = re.compile(r'\b(most common|most frequent|top|main|biggest)\b')
+SENTIMENT = re.compile(r'\bsentiment\b')
+RESPONSE_TIME = re.compile(r'\bresponse times?\b')
+CATEGORY = re.compile(r'\b(categor(?:y|ies)|issues?|topics?)\b')
+DATE_RANGE = re.compile(r'\b(date range|first chat|last chat|earliest|latest|period|time span)\b')
+POSITIVE = re.compile(r'\bpositive\b')
+NEGATIVE = re.compile(r'\bnegative\b')
+# Mood qualifiers; only a count can apply positive/negative, and nothing applies the rest
+POLARITY = re.compile(r'\b(positive|negative|neutral|happy|unhappy|satisfied|dissatisfied|angry|upset|frustrated)\b')
+# Breakdowns ("per operator", "which category") need a table, not the single figure an intent gives
+GROUPING = re.compile(r'\b(per|each|every|by|which|what)\s+(?:\w+\s+)?'
+                      r'(operators?|agents?|customers?|categor(?:y|ies)|issues?|topics?|days?|weeks?|months?|years?)\b')
+# Cut-offs like "over 10 minutes" or "below -0.5" restrict the rows in a way question_filter doesn't
+THRESHOLD = re.compile(r'(?:\b(?:over|above|below|under|more than|less than|greater than|fewer than|'
+                       r'at least|at most|longer than|shorter than|exceeding)\s+|[<>]=?\s*)-?\d')
+SLOWEST = re.compile(r'\b(slowest|longest|max(?:imum)?)\b')
+FASTEST = re.compile(r'\b(fastest|quickest|shortest|min(?:imum)?)\b')
+# Any month or date reference, in any case; checked against what question_filter could apply
+DATE_MENTION = re.compile(r'\b(january|february|march|april|may|june|july|august|september|october|november|december|'
+                          r'jan|feb|mar|apr|jun|jul|aug|sept?|oct|nov|dec|yesterday|today|tonight|weekend|quarter|'
+                          r'q[1-4]|(?:last|this|next|previous) (?:week|month|year)|\d{4}|\d{1,2}/\d{1,2}(?:/\d{2,4})?)\b')
+
+
+class QueryRouter:
+    """
+    Answers common aggregate questions straight from a customer's DataFrame.
+
+    Recognized intents: counts (optionally positive/negative), average
+    sentiment, average/slowest/fastest response time, most common category
+    and the date range, each restricted to any dates, categories, operators
+    or customers the question names (see ContextSummary.question_filter).
+    answer() returns None for anything else, including breakdowns, thresholds
+    and mood qualifiers an intent can't apply, so the caller can fall through
+    to the LLM; numbers are computed exactly, never generated.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.metrics = {'answered': 0, 'fallthrough': 0, 'answer_seconds': 0.0}
+
+    def answer(self, dataset, question):
+        started = time.perf_counter()
+        text = self._answer(dataset, question)
+        with self._lock:
+            if text is None:
+                self.metrics['fallthrough'] += 1
+            else:
+                self.metrics['answered'] += 1
+                self.metrics['answer_seconds'] += time.perf_counter() - started
+        return text
+
+    def _answer(self, dataset, question):
+        q = question.lower()
+        if OPEN_ENDED.search(q):
+            return None
+        intent = _intent(q)
+        if intent is None or _unfiltered_date(question):
+            return None
+
+        # Work on the summary's numpy columns: pandas indexing alone would cost more than the answer
+        summary = dataset.summary
+        mask, labels = summary.question_filter(question)
+        scope = f" for {' / '.join(labels)}" if labels else ''
+        index = np.arange(len(summary.df)) if mask is None else np.flatnonzero(mask)
+        if len(index) == 0:
+            return f"There are no chats{scope} in customer {dataset.customer_id}'s data."
+
+        total = len(index)
+        sentiment = summary.arrays['sentiment'][index]
+        response_time = summary.arrays['response_time'][index]
+        sentiment = sentiment[~np.isnan(sentiment)]
+
+        if intent == 'count':
+            if POSITIVE.search(q):
+                return f"There are {int((sentiment > 0.3).sum())} positive chats (sentiment above 0.3){scope}, out of {total}."
+            if NEGATIVE.search(q):
+                return f"There are {int((sentiment < -0.3).sum())} negative chats (sentiment below -0.3){scope}, out of {total}."
+            return f"There are {total} chats{scope}."
+        if intent == 'sentiment':
+            if len(sentiment) == 0:
+                return None
+            return (f"The average sentiment score{scope} is {sentiment.mean():.2f} (range -1 to 1), "
+                    f"over {len(sentiment)} chats; min {sentiment.min():.2f}, max {sentiment.max():.2f}.")
+        if intent in ('slowest_response', 'fastest_response', 'response_time'):
+            valid = ~np.isnan(response_time)
+            if not valid.any():
+                return None
+            if intent == 'response_time':
+                values = response_time[valid]
+                return (f"The average response time{scope} is {values.mean():.1f} minutes "
+                        f"over {len(values)} chats (median {np.median(values):.1f}).")
+            pick = np.nanargmax if intent == 'slowest_response' else np.nanargmin
+            position = pick(response_time)
+            row = summary.df.iloc[index[position]]
+            # Operator and customer columns are optional in uploaded data
+            who = ' with '.join(str(row[col]) for col in ('Operator_Name', 'Customer_Name') if col in row.index)
+            return (f"The {intent.split('_')[0]} response{scope} took {response_time[position]:.1f} minutes"
+                    f"{': ' + who if who else ''} on {_day(row['Date'])} ({row['Category']}).")
+        if intent == 'top_category':
+            codes, counts = np.unique(summary.arrays['Category'][index], return_counts=True)
+            names = summary.labels['Category'][codes]
+            order = np.argsort(-counts, kind='stable')
+            top = ', '.join(f"{names[i]} ({counts[i]})" for i in order[:3])
+            return f"The most common category{scope} is {names[order[0]]} with {counts[order[0]]} of {total} chats. Top categories: {top}."
+        if intent == 'date_range':
+            dates = summary.arrays['date'][index]
+            dates = dates[~np.isnat(dates)]
+            if len(dates) == 0:
+                return None
+            return f"The chats{scope} run from {_day(dates.min())} to {_day(dates.max())} ({total} chats)."
+        return None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics)
+        answered = stats.pop('answer_seconds')
+        stats['avg_answer_ms'] = answered / stats['answered'] * 1000 if stats['answered'] else 0.0
+        return stats
+
+
+def _intent(q):
+    intent = _base_intent(q)
+    if intent is None or THRESHOLD.search(q):
+        return None
+    for word, target in GROUPING.findall(q):
+        # "which category is most common" is the top_category question itself; any other breakdown isn't
+        if not (intent == 'top_category' and word in ('which', 'what') and CATEGORY.match(target)):
+            return None
+    qualifiers = set(POLARITY.findall(q))
+    if qualifiers and not (intent == 'count' and len(qualifiers) == 1 and qualifiers <= {'positive', 'negative'}):
+        return None
+    return intent
+
+
+def _base_intent(q):
+    # Most specific intents first: "how many negative chats" is a count, not a sentiment question
+    if COUNT.search(q):
+        # "how many chats had a slow response time" counts by a metric, which no intent does
+        return None if AVERAGE.search(q) or RESPONSE_TIME.search(q) else 'count'
+    if RESPONSE_TIME.search(q):
+        if SLOWEST.search(q):
+            return 'slowest_response'
+        if FASTEST.search(q):
+            return 'fastest_response'
+        return 'response_time'
+    if SENTIMENT.search(q) and AVERAGE.search(q):
+        return 'sentiment'
+    if CATEGORY.search(q) and TOP.search(q):
+        return 'top_category'
+    if DATE_RANGE.search(q):
+        return 'date_range'
+    return None
+
+
+def _unfiltered_date(question):
+    # True when the question names a month or date that question_filter can't apply
+    # (lower-case month names, a bare "May", relative dates), so an answer would be unscoped
+    rest = ISO_DATE.sub(' ', question)
+    rest = MONTH_DAY.sub(lambda m: m.group(0) if m.group(1) == 'May' and not m.group(2) else ' ', rest)
+    return DATE_MENTION.search(rest.lower()) is not None
+
+
+def _day(value):
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+# Finest to coarsest
+RESOLUTIONS = ('day', 'week', 'month')
+ROLLUP_COLUMNS = ['chats', 'sentiment_mean', 'sentiment_min', 'sentiment_max', 'sentiment_count',
+                  'response_time_p50', 'response_time_p90']
+
+
+def bucket_starts(dates, resolution):
+    """Start of the day, week (Monday) or month each timestamp falls in."""
+    dates = pd.DatetimeIndex(dates)
+    days = dates.normalize()
+    if resolution == 'day':
+        return days
+    if resolution == 'week':
+        return days - pd.to_timedelta(days.dayofweek, unit='D')
+    if resolution == 'month':
+        return days - pd.to_timedelta(days.day - 1, unit='D')
+    raise ValueError(f"Unknown resolution: {resolution}")
+
+
+def _numeric(df, column):
+    # Float values of a column, or all-NaN when the frame doesn't have it (e.g. a chart's column subset)
+    if column not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+
+
+def _aggregate(buckets, sentiment, response_time):
+    frame = pd.DataFrame({'bucket': buckets, 'sentiment': sentiment, 'response_time': response_time})
+    grouped = frame.groupby('bucket', sort=True)
+    table = grouped['sentiment'].agg(['size', 'mean', 'min', 'max', 'count'])
+    table.columns = ROLLUP_COLUMNS[:5]
+    quantiles = grouped['response_time'].quantile([0.5, 0.9]).unstack()
+    table['response_time_p50'] = quantiles[0.5] if len(quantiles) else np.nan
+    table['response_time_p90'] = quantiles[0.9] if len(quantiles) else np.nan
+    return table
+
+
+class Rollups:
+    """
+    Daily, weekly and monthly rollup tables of sentiment and response time.
+
+    Each table has one row per bucket with the chat count, sentiment
+    mean/min/max/count and response-time p50/p90. Appending rows recomputes
+    only the buckets those rows fall in; every other bucket is left as is.
+    Range queries and charts read these tables, so their cost depends on the
+    number of buckets rather than the number of chats.
+    """
+
+    def __init__(self, df):
+        dates = pd.to_datetime(df['Date'], errors='coerce')
+        valid = dates.notna().to_numpy()
+        self._dates = dates.to_numpy()[valid]
+        self._sentiment = _numeric(df, 'Sentiment_Score')[valid]
+        self._response_time = _numeric(df, 'Response_Time_Minutes')[valid]
+        self.tables = {
+            res: _aggregate(bucket_starts(self._dates, res).to_numpy(), self._sentiment, self._response_time)
+            for res in RESOLUTIONS
+        }
+
+    @property
+    def nbytes(self):
+        """Memory held by the per-row arrays and the rollup tables."""
+        arrays = [self._dates, self._sentiment, self._response_time]
+        return (sum(array.nbytes for array in arrays)
+                + sum(int(table.memory_usage(deep=True).sum()) for table in self.tables.values()))
+
+    def update(self, new_rows):
+        """Add appended rows and recompute just the buckets they touch."""
+        new = Rollups(new_rows)
+        if len(new._dates) == 0:
+            return
+        self._dates = np.concatenate([self._dates, new._dates])
+        self._sentiment = np.concatenate([self._sentiment, new._sentiment])
+        self._response_time = np.concatenate([self._response_time, new._response_time])
+        for res in RESOLUTIONS:
+            touched = new.tables[res].index
+            # Only rows from the first touched bucket on can fall in one, and appends are
+            # usually recent, so buckets are computed for a small tail rather than every row
+            candidates = np.flatnonzero(self._dates >= touched[0].to_datetime64())
+            buckets = bucket_starts(self._dates[candidates], res).to_numpy()
+            in_touched = np.isin(buckets, touched.to_numpy())
+            rows = candidates[in_touched]
+            recomputed = _aggregate(buckets[in_touched], self._sentiment[rows], self._response_time[rows])
+            table = self.tables[res]
+            self.tables[res] = pd.concat([table.drop(touched, errors='ignore'), recomputed]).sort_index()
+
+    def select(self, start=None, end=None, max_points=500):
+        """
+        The finest rollup whose bucket count over [start, end] is at most max_points.
+
+        Falls back to the monthly table when even that has more buckets.
+
+        Returns:
+        tuple: (resolution, DataFrame of the buckets in range)
+        """
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        for res in RESOLUTIONS:
+            table = self.tables[res]
+            # Include the bucket containing `start`, not only buckets starting after it
+            low = bucket_starts([start], res)[0] if start is not None else None
+            table = table.loc[low:end]
+            if len(table) <= max_points or res == RESOLUTIONS[-1]:
+                return res, table
+
+
+def summarize(table):
+    """
+    Totals over a slice of rollup buckets (weighted by each bucket's count).
+
+    Returns:
+    dict: chats, average/min/max sentiment over the covered buckets
+    """
+    scored = table['sentiment_count'].sum()
+    return {
+        'chats': int(table['chats'].sum()),
+        'average_sentiment': float((table['sentiment_mean'] * table['sentiment_count']).sum() / scored) if scored else None,
+        'min_sentiment': float(table['sentiment_min'].min()) if scored else None,
+        'max_sentiment': float(table['sentiment_max'].max()) if scored else None
+    }
+
+
+def table_records(table):
+    """Rollup buckets as JSON-friendly dicts (NaN -> None)."""
+    records = table.round(3).reset_index(names='bucket')
+    records['bucket'] = records['bucket'].dt.strftime('%Y-%m-%d')
+    return [{k: (None if isinstance(v, float) and v != v else v) for k, v in row.items()}
+            for row in records.to_dict(orient='records')]
@@ -1,21 +1,29 @@
 import os
+import hashlib
+import multiprocessing
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import matplotlib
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import seaborn as sns
 from datetime import datetime
+from config import CHART_RENDER_WORKERS, CHART_MAX_POINTS
+from rollups import Rollups
 
 # Configure matplotlib backend and font
 matplotlib.use('Agg')
 matplotlib.rc('font', family='Microsoft JhengHei')  # Use Microsoft JhengHei for Chinese characters
 
-def generate_sentiment_plot(customer_id, customer_data):
+def generate_sentiment_plot(customer_id, customer_data, output_path=None):
     """
     Generate a trend chart based on customer service chat sentiment and save as a .png file.
     
     Parameters:
     customer_id (str): Customer ID or name
     customer_data (DataFrame): DataFrame containing 'Date', 'Sentiment_Score', and 'Category' columns
+    output_path (str): Where to save the image (default: static/sentiment_charts/sentiment_<customer_id>.png)
     
     Returns:
     output_path (str): Path to the saved image file
@@ -25,40 +33,44 @@ def generate_sentiment_plot(customer_id, customer_data):
     output_dir = "static/sentiment_charts"
     os.makedirs(output_dir, exist_ok=True)
 
-    # Process data
-    customer_data["Date"] = pd.to_datetime(customer_data["Date"], errors="coerce")
-    customer_data["Sentiment_Score"] = pd.to_numeric(customer_data["Sentiment_Score"], errors="coerce")
+    # Roll rows up into day/week/month buckets, so drawing cost depends on the bucket count, not the history length
+    resolution, buckets = Rollups(customer_data).select(max_points=CHART_MAX_POINTS)
+    buckets = buckets[buckets["sentiment_count"] > 0]
 
     # Calculate average sentiment
-    avg_sentiment = customer_data["Sentiment_Score"].mean()
+    avg_sentiment = pd.to_numeric(customer_data["Sentiment_Score"], errors="coerce").mean()
 
     # Create plot
-    plt.figure(figsize=(12, 6))
-    sns.lineplot(x="Date", y="Sentiment_Score", data=customer_data, marker="o", label="Sentiment Scores", color="blue", errorbar=None)
-    plt.axhline(y=avg_sentiment, color='orange', linestyle='--', label=f"Average Sentiment ({avg_sentiment:.2f})")
-    plt.xlabel("Date")
-    plt.ylabel("Sentiment Score")
-    plt.title(f"Customer {customer_id} - Sentiment Trend Analysis")
-    plt.xticks(rotation=45)
-    plt.grid(True)
-    plt.legend()
-    plt.tight_layout()
-    plt.ylim(-1, 1)  # Set sentiment score range to -1 to 1
+    fig = Figure(figsize=(12, 6))
+    ax = fig.add_subplot()
+    ax.plot(buckets.index, buckets["sentiment_mean"], marker="o" if len(buckets) <= 60 else None,
+            color="blue", label=f"Sentiment Scores ({ {'day': 'daily', 'week': 'weekly', 'month': 'monthly'}[resolution]} average)")
+    ax.fill_between(buckets.index, buckets["sentiment_min"], buckets["sentiment_max"], color="blue", alpha=0.15,
+                    label="Min-max range")
+    ax.axhline(y=avg_sentiment, color='orange', linestyle='--', label=f"Average Sentiment ({avg_sentiment:.2f})")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Sentiment Score")
+    ax.set_title(f"Customer {customer_id} - Sentiment Trend Analysis")
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True)
+    ax.legend()
+    fig.tight_layout()
+    ax.set_ylim(-1, 1)  # Set sentiment score range to -1 to 1
 
     # Save image
-    output_path = os.path.join(output_dir, f"sentiment_{customer_id}.png")
-    plt.savefig(output_path)
-    plt.close()
+    output_path = output_path or os.path.join(output_dir, f"sentiment_{customer_id}.png")
+    fig.savefig(output_path)
 
     return output_path
 
-def generate_category_distribution(customer_id, customer_data):
+def generate_category_distribution(customer_id, customer_data, output_path=None):
     """
     Generate a pie chart showing the distribution of customer service categories.
     
     Parameters:
     customer_id (str): Customer ID or name
     customer_data (DataFrame): DataFrame containing 'Category' column
+    output_path (str): Where to save the image (default: static/category_charts/categories_<customer_id>.png)
     
     Returns:
     output_path (str): Path to the saved image file
@@ -70,29 +82,31 @@ def generate_category_distribution(customer_id, customer_data):
     
     # Count categories
     category_counts = customer_data["Category"].value_counts()
+    category_counts = category_counts[category_counts > 0]
     
     # Create plot
-    plt.figure(figsize=(10, 7))
-    plt.pie(category_counts, labels=category_counts.index, autopct='%1.1f%%', 
-            shadow=True, startangle=90, colors=sns.color_palette("pastel"))
-    plt.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle
-    plt.title(f"Customer {customer_id} - Service Category Distribution")
-    plt.tight_layout()
+    fig = Figure(figsize=(10, 7))
+    ax = fig.add_subplot()
+    ax.pie(category_counts, labels=category_counts.index, autopct='%1.1f%%', 
+           shadow=True, startangle=90, colors=sns.color_palette("pastel"))
+    ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle
+    ax.set_title(f"Customer {customer_id} - Service Category Distribution")
+    fig.tight_layout()
     
     # Save image
-    output_path = os.path.join(output_dir, f"categories_{customer_id}.png")
-    plt.savefig(output_path)
-    plt.close()
+    output_path = output_path or os.path.join(output_dir, f"categories_{customer_id}.png")
+    fig.savefig(output_path)
     
     return output_path
 
-def generate_response_time_plot(customer_id, customer_data):
+def generate_response_time_plot(customer_id, customer_data, output_path=None):
     """
     Generate a bar chart showing average response times by category.
     
     Parameters:
     customer_id (str): Customer ID or name
     customer_data (DataFrame): DataFrame containing 'Category' and 'Response_Time_Minutes' columns
+    output_path (str): Where to save the image (default: static/response_time_charts/response_time_<customer_id>.png)
     
     Returns:
     output_path (str): Path to the saved image file
@@ -103,25 +117,101 @@ def generate_response_time_plot(customer_id, customer_data):
     os.makedirs(output_dir, exist_ok=True)
     
     # Calculate average response time by category
-    avg_response_times = customer_data.groupby("Category")["Response_Time_Minutes"].mean().sort_values(ascending=False)
+    avg_response_times = customer_data.groupby("Category", observed=True)["Response_Time_Minutes"].mean().sort_values(ascending=False)
     
     # Create plot
-    plt.figure(figsize=(12, 6))
-    sns.barplot(x=avg_response_times.index, y=avg_response_times.values, palette="viridis")
-    plt.xlabel("Category")
-    plt.ylabel("Average Response Time (minutes)")
-    plt.title(f"Customer {customer_id} - Average Response Time by Category")
-    plt.xticks(rotation=45)
-    plt.grid(True, axis='y')
-    plt.tight_layout()
+    fig = Figure(figsize=(12, 6))
+    ax = fig.add_subplot()
+    sns.barplot(x=avg_response_times.index.astype(str), y=avg_response_times.values, palette="viridis", ax=ax)
+    ax.set_xlabel("Category")
+    ax.set_ylabel("Average Response Time (minutes)")
+    ax.set_title(f"Customer {customer_id} - Average Response Time by Category")
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True, axis='y')
+    fig.tight_layout()
     
     # Save image
-    output_path = os.path.join(output_dir, f"response_time_{customer_id}.png")
-    plt.savefig(output_path)
-    plt.close()
+    output_path = output_path or os.path.join(output_dir, f"response_time_{customer_id}.png")
+    fig.savefig(output_path)
     
     return output_path
 
+# Per-customer charts: name -> (renderer, output directory, file prefix, columns the chart reads)
+CUSTOMER_CHARTS = {
+    'sentiment': (generate_sentiment_plot, "static/sentiment_charts", "sentiment", ["Date", "Sentiment_Score"]),
+    'category': (generate_category_distribution, "static/category_charts", "categories", ["Category"]),
+    'response_time': (generate_response_time_plot, "static/response_time_charts", "response_time",
+                      ["Category", "Response_Time_Minutes"])
+}
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def _get_render_pool():
+    # One process pool shared by all uploads; spawn avoids forking a multi-threaded server
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(max_workers=CHART_RENDER_WORKERS,
+                                               mp_context=multiprocessing.get_context('spawn'))
+        return _render_pool
+
+def chart_fingerprint(customer_id, customer_data, columns):
+    """
+    Content hash of the columns a chart reads (plus the customer ID shown in its title).
+    
+    Returns:
+    str: Short hex digest identifying the rendered image
+    """
+    digest = hashlib.sha1(str(customer_id).encode('utf-8'))
+    subset = customer_data[columns]
+    digest.update(pd.util.hash_pandas_object(subset, index=False).to_numpy().tobytes())
+    digest.update(",".join(map(str, subset.dtypes)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def render_customer_charts(customer_id, customer_data, parallel=True, charts=None):
+    """
+    Render the sentiment, category and response time charts for one customer.
+    
+    Images are cached under a content hash of the input frame, so re-uploading
+    identical data returns the existing files without redrawing. Missing charts
+    are rendered concurrently in a shared process pool.
+    
+    Parameters:
+    customer_id (str): Customer ID or name
+    customer_data (DataFrame): Customer chat data
+    parallel (bool): Render in the process pool (False renders in this process)
+    charts (iterable): Chart names to render (default: all of CUSTOMER_CHARTS)
+    
+    Returns:
+    dict: Chart name -> path of the saved image file
+    """
+    paths = {}
+    pending = {}
+    for name, (renderer, output_dir, prefix, columns) in CUSTOMER_CHARTS.items():
+        if charts is not None and name not in charts:
+            continue
+        os.makedirs(output_dir, exist_ok=True)
+        fingerprint = chart_fingerprint(customer_id, customer_data, columns)
+        output_path = os.path.join(output_dir, f"{prefix}_{customer_id}_{fingerprint}.png")
+        paths[name] = output_path
+        if os.path.exists(output_path):
+            continue
+        # Write to a temporary name so a half-written PNG is never served from the cache
+        tmp_path = f"{output_path[:-4]}.{uuid.uuid4().hex}.tmp.png"
+        args = (customer_id, customer_data[columns].copy(), tmp_path)
+        if parallel:
+            pending[name] = (_get_render_pool().submit(renderer, *args), tmp_path)
+        else:
+            renderer(*args)
+            os.replace(tmp_path, output_path)
+
+    for name, (future, tmp_path) in pending.items():
+        future.result()
+        os.replace(tmp_path, paths[name])
+
+    return paths
+
 def generate_operator_performance_plot(operator_data):
     """
     Generate a bar chart showing operator performance metrics.
@@ -146,11 +236,9 @@ def generate_operator_performance_plot(operator_data):
     operator_metrics.columns = ['avg_sentiment', 'total_chats', 'avg_response_time']
     operator_metrics = operator_metrics.sort_values(by='avg_sentiment', ascending=False)
     
-    # Create plot
-    plt.figure(figsize=(12, 8))
-    
-    # Create a grid for subplots
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
+    # Create a figure with a grid of two subplots
+    fig = Figure(figsize=(12, 8))
+    ax1, ax2 = fig.subplots(2, 1)
     
     # Plot average sentiment
     sns.barplot(x=operator_metrics.index, y=operator_metrics['avg_sentiment'], ax=ax1, palette="viridis")
@@ -166,12 +254,11 @@ def generate_operator_performance_plot(operator_data):
     ax2.set_xticklabels(ax2.get_xticklabels(), rotation=45, ha='right')
     ax2.grid(True, axis='y')
     
-    plt.tight_layout()
+    fig.tight_layout()
     
     # Save image
     output_path = os.path.join(output_dir, "operator_performance.png")
-    plt.savefig(output_path)
-    plt.close()
+    fig.savefig(output_path)
     
     return output_path
 
@@ -199,11 +286,9 @@ def generate_customer_complaints_plot(customer_data):
     customer_metrics.columns = ['avg_sentiment', 'total_chats', 'avg_response_time']
     customer_metrics = customer_metrics.sort_values(by='total_chats', ascending=False).head(10)
     
-    # Create plot
-    plt.figure(figsize=(12, 8))
-    
-    # Create a grid for subplots
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
+    # Create a figure with a grid of two subplots
+    fig = Figure(figsize=(12, 8))
+    ax1, ax2 = fig.subplots(2, 1)
     
     # Plot number of chats
     sns.barplot(x=customer_metrics.index, y=customer_metrics['total_chats'], ax=ax1, palette="viridis")
@@ -219,11 +304,10 @@ def generate_customer_complaints_plot(customer_data):
     ax2.set_xticklabels(ax2.get_xticklabels(), rotation=45, ha='right')
     ax2.grid(True, axis='y')
     
-    plt.tight_layout()
+    fig.tight_layout()
     
     # Save image
     output_path = os.path.join(output_dir, "customer_complaints.png")
-    plt.savefig(output_path)
-    plt.close()
+    fig.savefig(output_path)
     
     return output_path
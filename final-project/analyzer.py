@@ -1,55 +1,33 @@
-import pandas as pd
-from datetime import datetime
-import numpy as np
+import os
+import sys
+# Shared loader lives at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from chat_loader import load_chat_log
+from chat_stats import get_chat_stats, response_times, summarize_response_times
 
 def analyze_chat_data(csv_file):
     # Load the data
-    df = pd.read_csv(csv_file)
+    df = load_chat_log(csv_file)
     
-    # Basic statistics
-    stats = {
-        'total_messages': len(df),
-        'unique_customers': len(df[df['sender'] == 'customer']),
-        'average_response_time': calculate_response_time(df),
-        'issue_distribution': analyze_issues(df),
-        'sentiment_distribution': analyze_sentiment(df),
-        'daily_activity': analyze_daily_activity(df)
-    }
-    
-    return stats
+    # All statistics come from one shared pass over the data
+    return get_chat_stats(df).as_dict()
 
 def calculate_response_time(df):
     # Calculate average response time between customer and agent
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df.sort_values('timestamp')
-    
-    response_times = []
-    for i in range(1, len(df)):
-        if df.iloc[i-1]['sender'] == 'customer' and df.iloc[i]['sender'] == 'agent':
-            response_times.append((df.iloc[i]['timestamp'] - df.iloc[i-1]['timestamp']).total_seconds())
-    
-    if response_times:
-        return np.mean(response_times)
-    return 0
-
-def analyze_issues(df):
-    # Count occurrences of each issue category
-    return df[df['sender'] == 'customer']['issue_category'].value_counts().to_dict()
-
-def analyze_sentiment(df):
-    # Count occurrences of each sentiment
-    return df['sentiment'].value_counts().to_dict()
-
-def analyze_daily_activity(df):
-    # Group by date and count messages
-    df['date'] = pd.to_datetime(df['timestamp']).dt.date
-    return df.groupby('date').size().to_dict()
+    return summarize_response_times(response_times(df))['mean']
 
 def print_analysis(stats):
     print("\n=== Chat Data Analysis ===\n")
     print(f"Total Messages: {stats['total_messages']}")
     print(f"Unique Customers: {stats['unique_customers']}")
-    print(f"Average Response Time: {stats['average_response_time']:.2f} seconds\n")
+    print(f"Average Response Time: {stats['average_response_time']:.2f} seconds")
+    rt = stats['response_time_stats']
+    print(f"Response Time Median / P90 / P99: {rt['median']:.2f} / {rt['p90']:.2f} / {rt['p99']:.2f} seconds\n")
+    
+    if 'response_time_by_conversation' in stats:
+        print("=== Response Time by Conversation ===")
+        print(stats['response_time_by_conversation'].round(2).to_string())
+        print()
     
     print("=== Issue Distribution ===")
     for issue, count in stats['issue_distribution'].items():
@@ -0,0 +1,101 @@
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import pandas as pd
+from report_generator import ChatReportGenerator
+# Shared loader lives at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from chat_loader import load_chat_log
+
+# Columns that identify the customer a report is for, in order of preference
+CUSTOMER_COLUMNS = ['customer_id', 'customer', 'Customer_Name']
+
+def find_customer_column(df):
+    # Not chat_stats.find_conversation_column: that prefers conversation/thread IDs,
+    # which would give one report per conversation instead of per customer
+    for col in CUSTOMER_COLUMNS:
+        if col in df.columns:
+            return col
+    return None
+
+def safe_name(value):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(value)).strip('_') or 'unknown'
+
+def partition_chat_log(df, customer_col, by_month=False):
+    # Group the log by customer (and month, if requested)
+    keys = [df[customer_col]]
+    if by_month:
+        keys.append(pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m').rename('month'))
+    return df.groupby(keys, sort=True, observed=True)
+
+def iter_partitions(groups):
+    # Yield (file name, report title, frame) for each group
+    for key, part in groups:
+        key = key if isinstance(key, tuple) else (key,)
+        label = ' '.join(str(k) for k in key)
+        yield '_'.join(safe_name(k) for k in key), f"Chat Analysis Report - {label}", part
+
+def build_report(name, title, df, output_dir):
+    # Runs in a worker process: render one report and time it
+    start = time.perf_counter()
+    output_file = os.path.join(output_dir, f"chat_report_{name}.pdf")
+    ChatReportGenerator(df=df.reset_index(drop=True), title=title).create_report(output_file)
+    return name, output_file, time.perf_counter() - start
+
+def generate_reports(csv_file, output_dir="reports", customer_col=None, by_month=False, workers=None):
+    df = load_chat_log(csv_file)
+    customer_col = customer_col or find_customer_column(df)
+    if customer_col is None:
+        raise ValueError("No customer column found; pass --customer-column.")
+    os.makedirs(output_dir, exist_ok=True)
+
+    groups = partition_chat_log(df, customer_col, by_month)
+    total = groups.ngroups
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 4  # Keep only a few partitions queued so pickled frames don't pile up
+
+    start = time.perf_counter()
+    progress = {'done': 0, 'report_seconds': 0.0, 'failures': []}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        for name, title, part in iter_partitions(groups):
+            pending[executor.submit(build_report, name, title, part, output_dir)] = name
+            if len(pending) >= max_pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    _record(future, pending.pop(future), total, progress)
+        for future in list(pending):
+            _record(future, pending.pop(future), total, progress)
+
+    elapsed = time.perf_counter() - start
+    done = progress['done']
+    failures = progress['failures']
+    print(f"\nGenerated {done - len(failures)}/{total} reports in {elapsed:.2f}s with {workers} workers "
+          f"({progress['report_seconds'] / max(done, 1):.2f}s per report, {done / elapsed if elapsed else 0:.1f} reports/sec).")
+    if failures:
+        print(f"Failed reports: {', '.join(failures)}")
+    return elapsed
+
+def _record(future, name, total, progress):
+    progress['done'] += 1
+    try:
+        _, output_file, seconds = future.result()
+        progress['report_seconds'] += seconds
+        print(f"[{progress['done']}/{total}] {output_file} ({seconds:.2f}s)")
+    except Exception as e:
+        progress['failures'].append(name)
+        print(f"[{progress['done']}/{total}] {name} failed: {str(e)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate one chat analysis report per customer in parallel.")
+    parser.add_argument("csv_file", help="Chat log covering many customers")
+    parser.add_argument("--output-dir", default="reports")
+    parser.add_argument("--customer-column", default=None,
+                        help="Column identifying the customer (default: first of customer_id/customer/Customer_Name)")
+    parser.add_argument("--by-month", action="store_true", help="Produce one report per customer per month")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+    generate_reports(args.csv_file, args.output_dir, args.customer_column, args.by_month, args.workers)
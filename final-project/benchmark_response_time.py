@@ -0,0 +1,57 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from analyzer import calculate_response_time
+from chat_stats import response_time_by_conversation
+
+def legacy_calculate_response_time(df):
+    # The original row-by-row implementation, kept as the benchmark baseline
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = df.sort_values('timestamp')
+
+    response_times = []
+    for i in range(1, len(df)):
+        if df.iloc[i-1]['sender'] == 'customer' and df.iloc[i]['sender'] == 'agent':
+            response_times.append((df.iloc[i]['timestamp'] - df.iloc[i-1]['timestamp']).total_seconds())
+
+    if response_times:
+        return np.mean(response_times)
+    return 0
+
+def make_chat_log(rows, customers=1000, seed=0):
+    # Synthetic log with strictly increasing timestamps and random senders
+    rng = np.random.default_rng(seed)
+    gaps = rng.integers(1, 120, size=rows)
+    return pd.DataFrame({
+        'timestamp': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.cumsum(gaps), unit='s'),
+        'sender': rng.choice(['customer', 'agent'], size=rows),
+        'customer_id': rng.integers(0, customers, size=rows)
+    })
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare loop vs vectorized response time calculation.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--max-legacy-rows", type=int, default=100_000,
+                        help="Skip the row-by-row baseline above this size (it takes minutes)")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'legacy (s)':>12} {'vectorized (s)':>15} {'per-conv (s)':>13} {'speedup':>9}")
+    for rows in args.sizes:
+        df = make_chat_log(rows)
+        fast, fast_time = time_call(calculate_response_time, df.copy())
+        _, conv_time = time_call(response_time_by_conversation, df.copy(), 'customer_id')
+        if rows <= args.max_legacy_rows:
+            slow, slow_time = time_call(legacy_calculate_response_time, df.copy())
+            assert np.isclose(slow, fast), (slow, fast)
+            print(f"{rows:>10} {slow_time:>12.3f} {fast_time:>15.4f} {conv_time:>13.4f} {slow_time / fast_time:>8.0f}x")
+        else:
+            print(f"{rows:>10} {'skipped':>12} {fast_time:>15.4f} {conv_time:>13.4f} {'-':>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import weakref
+import numpy as np
+import pandas as pd
+
+# Columns that identify a conversation thread, in order of preference
+CONVERSATION_COLUMNS = ['conversation_id', 'thread_id', 'customer_id', 'customer']
+
+def find_conversation_column(df):
+    for col in CONVERSATION_COLUMNS:
+        if col in df.columns:
+            return col
+    return None
+
+def _counts(series):
+    # value_counts() without the zero rows categorical columns report for unobserved categories
+    counts = series.value_counts()
+    return counts[counts > 0].to_dict()
+
+def _reply_gaps(timestamps, senders, conversations=None):
+    # Seconds between each customer message and the agent message right after it.
+    # Inputs must already be in chronological (per-conversation) order.
+    previous_sender = senders.shift()
+    mask = (previous_sender == 'customer') & (senders == 'agent')
+    if conversations is not None:
+        mask &= conversations.shift() == conversations
+    return (timestamps - timestamps.shift())[mask].dt.total_seconds()
+
+def response_times(df, group_col=None):
+    # Seconds between each customer message and the agent message right after it,
+    # computed on shifted columns instead of a row-by-row loop
+    frame = pd.DataFrame({
+        'timestamp': pd.to_datetime(df['timestamp']),
+        'sender': df['sender'].to_numpy()
+    }, index=df.index)
+    if group_col is None:
+        frame = frame.sort_values('timestamp', kind='stable')
+        return _reply_gaps(frame['timestamp'], frame['sender'])
+
+    frame['conversation'] = df[group_col].to_numpy()
+    frame = frame.sort_values(['conversation', 'timestamp'], kind='stable')
+    seconds = _reply_gaps(frame['timestamp'], frame['sender'], frame['conversation'])
+    return pd.DataFrame({group_col: frame.loc[seconds.index, 'conversation'], 'response_time': seconds})
+
+def summarize_response_times(seconds):
+    # Mean, median and tail percentiles of a series of response times
+    if len(seconds) == 0:
+        return {'count': 0, 'mean': 0, 'median': 0, 'p90': 0, 'p99': 0}
+    values = seconds.to_numpy()
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'count': len(values), 'mean': values.mean(), 'median': p50, 'p90': p90, 'p99': p99}
+
+def summarize_by_conversation(per_reply, group_col):
+    # Response time statistics for each conversation (customer/thread)
+    grouped = per_reply.groupby(group_col)['response_time']
+    return pd.DataFrame({
+        'count': grouped.size(),
+        'mean': grouped.mean(),
+        'median': grouped.median(),
+        'p90': grouped.quantile(0.9),
+        'p99': grouped.quantile(0.99)
+    })
+
+def response_time_by_conversation(df, group_col):
+    return summarize_by_conversation(response_times(df, group_col), group_col)
+
+
+class ChatStats:
+    # Every aggregate the analyzer and the PDF report need, computed together:
+    # timestamps are parsed once and the frame is sorted once.
+
+    def __init__(self, df):
+        timestamps = pd.to_datetime(df['timestamp'])
+        order = np.argsort(timestamps.to_numpy(), kind='stable')
+        timestamps = timestamps.iloc[order].reset_index(drop=True)
+        senders = df['sender'].iloc[order].reset_index(drop=True)
+        is_customer = df['sender'] == 'customer'
+
+        self.total_messages = len(df)
+        self.unique_customers = int(is_customer.sum())
+        self.response_times = _reply_gaps(timestamps, senders)
+        self.response_time_stats = summarize_response_times(self.response_times)
+        self.issue_distribution = _counts(df.loc[is_customer, 'issue_category'])
+        self.sentiment_distribution = _counts(df['sentiment'])
+        self.daily_activity = timestamps.dt.date.value_counts().sort_index().to_dict()
+
+        self.conversation_column = find_conversation_column(df)
+        self.response_time_by_conversation = None
+        if self.conversation_column is not None:
+            # Re-order the already time-sorted rows by conversation; a stable sort keeps time order within each one
+            conversations = df[self.conversation_column].iloc[order].reset_index(drop=True)
+            by_conversation = np.argsort(conversations.to_numpy(), kind='stable')
+            conv_sorted = conversations.iloc[by_conversation].reset_index(drop=True)
+            seconds = _reply_gaps(
+                timestamps.iloc[by_conversation].reset_index(drop=True),
+                senders.iloc[by_conversation].reset_index(drop=True),
+                conv_sorted
+            )
+            per_reply = pd.DataFrame({self.conversation_column: conv_sorted[seconds.index], 'response_time': seconds})
+            self.response_time_by_conversation = summarize_by_conversation(per_reply, self.conversation_column)
+
+    @property
+    def average_response_time(self):
+        return self.response_time_stats['mean']
+
+    def as_dict(self):
+        stats = {
+            'total_messages': self.total_messages,
+            'unique_customers': self.unique_customers,
+            'average_response_time': self.average_response_time,
+            'response_time_stats': self.response_time_stats,
+            'issue_distribution': self.issue_distribution,
+            'sentiment_distribution': self.sentiment_distribution,
+            'daily_activity': self.daily_activity
+        }
+        if self.response_time_by_conversation is not None:
+            stats['response_time_by_conversation'] = self.response_time_by_conversation
+        return stats
+
+
+# id(df) -> (version key, ChatStats); entries are dropped when the frame is garbage collected
+_stats_cache = {}
+
+def get_chat_stats(df, version=0):
+    # Memoized ChatStats for a dataframe. Callers that mutate a frame in place
+    # should bump `version`; shape and column changes are detected automatically.
+    key = (version, df.shape, tuple(df.columns))
+    cached = _stats_cache.get(id(df))
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    stats = ChatStats(df)
+    if cached is None:
+        weakref.finalize(df, _stats_cache.pop, id(df), None)
+    _stats_cache[id(df)] = (key, stats)
+    return stats
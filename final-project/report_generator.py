@@ -3,24 +3,37 @@ from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import cm
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
-import numpy as np
+from matplotlib.figure import Figure
+from io import BytesIO
 import os
+import sys
+# Shared loader lives at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from chat_loader import load_chat_log
+from chat_stats import get_chat_stats
 
 class ChatReportGenerator:
-    def __init__(self, csv_file):
+    # Charts are drawn at 400x300 pt, so 150 dpi is already sharper than print needs
+    chart_dpi = 150
+
+    def __init__(self, csv_file=None, df=None, title="Chat Analysis Report"):
+        # Either load a CSV or take an already loaded frame (e.g. one customer's slice)
         self.csv_file = csv_file
-        self.df = pd.read_csv(csv_file)
+        self.df = df if df is not None else load_chat_log(csv_file)
+        self.title = title
         self.styles = getSampleStyleSheet()
+
+    @property
+    def stats(self):
+        # Shared, memoized aggregates: the data is only scanned once per report
+        return get_chat_stats(self.df)
         
     def create_report(self, output_file="chat_analysis_report.pdf"):
         doc = SimpleDocTemplate(output_file)
         elements = []
         
         # Add title
-        elements.append(Paragraph("Chat Analysis Report", self.styles["Title"]))
+        elements.append(Paragraph(self.title, self.styles["Title"]))
         elements.append(Spacer(1, 20))
         
         # Basic Statistics
@@ -43,53 +56,23 @@ class ChatReportGenerator:
             # Generate PDF
             doc.build(elements)
             print(f"Report generated successfully: {output_file}")
-            
-            # Clean up all temporary files
-            temp_files = [f for f in os.listdir('.') if f.startswith('temp_') and f.endswith('.png')]
-            for temp_file in temp_files:
-                try:
-                    os.remove(temp_file)
-                except Exception as e:
-                    print(f"Warning: Failed to remove temporary file {temp_file}: {str(e)}")
-        
         except Exception as e:
             print(f"Error generating report: {str(e)}")
-            # Clean up any temporary files if error occurs
-            temp_files = [f for f in os.listdir('.') if f.startswith('temp_') and f.endswith('.png')]
-            for temp_file in temp_files:
-                try:
-                    os.remove(temp_file)
-                except Exception as e:
-                    print(f"Warning: Failed to remove temporary file {temp_file}: {str(e)}")
             raise
         
         return output_file
 
     def _get_basic_stats(self):
-        return {
-            'total_messages': len(self.df),
-            'unique_customers': len(self.df[self.df['sender'] == 'customer']),
-            'average_response_time': self._calculate_response_time(),
-            'issue_distribution': self._analyze_issues(),
-            'sentiment_distribution': self._analyze_sentiment()
-        }
+        return self.stats.as_dict()
 
     def _calculate_response_time(self):
-        self.df['timestamp'] = pd.to_datetime(self.df['timestamp'])
-        self.df = self.df.sort_values('timestamp')
-        
-        response_times = []
-        for i in range(1, len(self.df)):
-            if self.df.iloc[i-1]['sender'] == 'customer' and self.df.iloc[i]['sender'] == 'agent':
-                response_times.append((self.df.iloc[i]['timestamp'] - self.df.iloc[i-1]['timestamp']).total_seconds())
-        
-        return np.mean(response_times) if response_times else 0
+        return self.stats.average_response_time
 
     def _analyze_issues(self):
-        return self.df[self.df['sender'] == 'customer']['issue_category'].value_counts().to_dict()
+        return self.stats.issue_distribution
 
     def _analyze_sentiment(self):
-        return self.df['sentiment'].value_counts().to_dict()
+        return self.stats.sentiment_distribution
 
     def _create_stats_section(self, stats):
         elements = []
@@ -120,73 +103,55 @@ class ChatReportGenerator:
         labels = list(issues.keys())
         sizes = list(issues.values())
         
-        plt.figure(figsize=(6, 4))
-        plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=140)
-        plt.title('Issue Distribution')
-        plt.tight_layout()
+        fig = Figure(figsize=(6, 4))
+        ax = fig.add_subplot()
+        ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=140)
+        ax.set_title('Issue Distribution')
+        fig.tight_layout()
         
-        return plt
+        return fig
 
     def _create_sentiment_chart(self):
         sentiment = self._analyze_sentiment()
         labels = list(sentiment.keys())
         sizes = list(sentiment.values())
         
-        plt.figure(figsize=(6, 4))
-        plt.bar(labels, sizes)
-        plt.title('Sentiment Distribution')
-        plt.xlabel('Sentiment')
-        plt.ylabel('Count')
-        plt.tight_layout()
+        fig = Figure(figsize=(6, 4))
+        ax = fig.add_subplot()
+        ax.bar(labels, sizes)
+        ax.set_title('Sentiment Distribution')
+        ax.set_xlabel('Sentiment')
+        ax.set_ylabel('Count')
+        fig.tight_layout()
         
-        return plt
+        return fig
 
     def _create_response_time_chart(self):
-        self.df['timestamp'] = pd.to_datetime(self.df['timestamp'])
-        self.df = self.df.sort_values('timestamp')
-        
-        response_times = []
-        for i in range(1, len(self.df)):
-            if self.df.iloc[i-1]['sender'] == 'customer' and self.df.iloc[i]['sender'] == 'agent':
-                response_times.append((self.df.iloc[i]['timestamp'] - self.df.iloc[i-1]['timestamp']).total_seconds())
-        
-        plt.figure(figsize=(6, 4))
-        plt.hist(response_times, bins=10)
-        plt.title('Response Time Distribution')
-        plt.xlabel('Response Time (seconds)')
-        plt.ylabel('Frequency')
-        plt.tight_layout()
-        
-        return plt
+        response_times = self.stats.response_times.to_numpy()
+        
+        fig = Figure(figsize=(6, 4))
+        ax = fig.add_subplot()
+        ax.hist(response_times, bins=10)
+        ax.set_title('Response Time Distribution')
+        ax.set_xlabel('Response Time (seconds)')
+        ax.set_ylabel('Frequency')
+        fig.tight_layout()
+        
+        return fig
 
     def _create_chart_section(self, title, chart):
         elements = []
         elements.append(Paragraph(title, self.styles["Heading2"]))
         
         try:
-            # Create a safe filename
-            safe_title = title.replace(" ", "_").replace("(", "").replace(")", "")
-            temp_file = f"temp_{safe_title}.png"
-            
-            # Save chart with proper format
-            chart.savefig(temp_file, bbox_inches='tight', dpi=300)
-            plt.close()
-            
-            # Wait for file to be fully written
-            import time
-            time.sleep(0.1)  # Small delay to ensure file is fully written
+            # Render the figure into memory; nothing touches the disk, so
+            # concurrent report builds in the same directory cannot collide
+            buffer = BytesIO()
+            chart.savefig(buffer, format='png', bbox_inches='tight', dpi=self.chart_dpi)
+            buffer.seek(0)
             
-            # Verify file exists and has content
-            if not os.path.exists(temp_file):
-                raise FileNotFoundError(f"Failed to create chart file: {temp_file}")
-                
-            # Get file size to verify it's not empty
-            file_size = os.path.getsize(temp_file)
-            if file_size < 100:  # Minimum size for a valid PNG
-                raise ValueError(f"Chart file is empty or invalid: {temp_file}")
-                
             # Add image to PDF
-            img = Image(temp_file, width=400, height=300)
+            img = Image(buffer, width=400, height=300)
             elements.append(img)
             
             # Add some space after the image